@@ -0,0 +1,111 @@
+"""Loads the engine plugins for benchmarks.
+
+Engines keep their config, caches and logs next to their module, so these are
+moved to a work folder and the user's ones are never touched. novaprinter has
+to be importable, e.g. PYTHONPATH=~/.local/share/qBittorrent/nova3.
+"""
+import contextlib
+import importlib
+import json
+import math
+import os
+import sys
+import tempfile
+import threading
+from dataclasses import MISSING, fields
+from pathlib import Path
+from typing import Optional
+
+REPO = Path(__file__).parent.parent
+NAMES = ("megapeer", "rutor", "rutracker")
+# results are parsed every time and logs are left out of timings
+OPTIONS = {"cacheTtl": 0, "torrentsSize": 0, "traceRate": 0.0, "logLevel": "WARNING",
+           "username": "bench", "password": "bench"}
+
+
+def load(name: str, workdir: Path, url: Optional[str] = None, **options):
+    """Imports an engine whose files are in workdir, with its urls moved to url."""
+    if str(REPO) not in sys.path:
+        sys.path.insert(0, str(REPO))
+    module = importlib.import_module(name)
+    workdir.mkdir(parents=True, exist_ok=True)
+    for key, value in list(vars(module).items()):
+        if key != "FILE" and isinstance(value, Path) and value.parent == module.BASEDIR:
+            setattr(module, key, workdir / value.name)
+    module.BASEDIR = workdir
+
+    config = {module.Config._to_camel(f.name): f.default if f.default_factory is MISSING
+              else f.default_factory() for f in fields(module.Config)}
+    config.update({k: v for k, v in {**OPTIONS, **options}.items() if k in config})
+    module.FILE_J.write_text(json.dumps(config, indent=4))
+    module.setup()
+
+    engine = getattr(module, name)
+    if url is not None:
+        if name == "rutracker":
+            engine.url = url + "forum/"
+            engine.url_dl = engine.url + "dl.php?t="
+            engine.url_login = engine.url + "login.php"
+        else:
+            engine.url = url
+            engine.url_dl = url + "download/"
+    return module
+
+
+def parser(module):
+    """Engine made only to parse pages, with draw(page, end) and its row divider."""
+    engine = object.__new__(getattr(module, module.__name__))
+    engine.output = lambda row: None
+    engine._seen, engine._lock = set(), threading.Lock()
+    if module.__name__ == "megapeer":
+        return (lambda page, end: engine.draw(page, None, end)), module.ITEM_DIVIDER
+    return engine.draw, module.ROW_DIVIDER
+
+
+def parse(module, page: bytes) -> int:
+    """Parses a page in download-sized chunks the way a search does, gives rows."""
+    draw, divider = parser(module)
+    stream = module.PageStream(draw, divider, module.Metrics())
+    for i in range(0, len(page), module.CHUNK_SIZE):
+        stream.feed(page[i:i + module.CHUNK_SIZE])
+    return len(stream.close())
+
+
+def percentiles(data: list, ranks: tuple = (0.5, 0.9, 0.99)) -> list:
+    """Nearest-rank percentiles, as the engines' --metrics summary gives them."""
+    data = sorted(data)
+    return [data[max(math.ceil(p * len(data)) - 1, 0)] for p in ranks]
+
+
+@contextlib.contextmanager
+def quiet():
+    """Sends what engines print to fd 1 to devnull."""
+    sys.stdout.flush()
+    saved = os.dup(1)
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+    try:
+        yield
+    finally:
+        sys.stdout.flush()
+        os.dup2(saved, 1)
+        os.close(saved)
+        os.close(devnull)
+
+
+@contextlib.contextmanager
+def capture():
+    """Collects lines engines print to fd 1 instead of showing them."""
+    lines = []
+    sys.stdout.flush()
+    saved = os.dup(1)
+    with tempfile.TemporaryFile() as out:
+        os.dup2(out.fileno(), 1)
+        try:
+            yield lines
+        finally:
+            sys.stdout.flush()
+            os.dup2(saved, 1)
+            os.close(saved)
+            out.seek(0)
+            lines += out.read().decode("utf-8", "replace").splitlines()
@@ -0,0 +1,56 @@
+"""TLS handshakes and time per page with and without kept-alive connections.
+
+    PYTHONPATH=<nova3> python bench/keep_alive.py [--pages 46] [--threads 6] [--latency 0]
+
+Requests megapeer result pages from the stand-in server over https, one by
+one and from a thread pool, with a plain urllib opener and with the engine's
+keep_alive_handler(). Every connection the server opens is a handshake.
+"""
+import argparse
+import sys
+import tempfile
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+import engines  # noqa: E402
+import server  # noqa: E402
+
+
+def run(stand_in: server.Server, opener, pages: int, threads: int) -> tuple:
+    def get(page: int) -> None:
+        with opener.open(f"{stand_in.url}browse.php?search=doctor&cat=0&page={page}", timeout=10) as r:
+            r.read()
+
+    stand_in.reset()
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(threads) as executor:
+        list(executor.map(get, range(pages)))
+    return (time.perf_counter() - t0) / pages, stand_in.stats["connections"]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=46)
+    parser.add_argument("--threads", type=int, default=6)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per response")
+    args = parser.parse_args()
+
+    stand_in = server.Server(0, args.pages * 50, args.latency, tls=True).start()
+    server.trust_any_certificate()
+    with tempfile.TemporaryDirectory() as workdir:
+        module = engines.load("megapeer", Path(workdir))
+    print(f"{args.pages} pages from {stand_in.url}")
+    print(f"{'':22}{'handshakes':>12}{'ms/page':>10}")
+    for threads in (1, args.threads):
+        for name, opener in (("urllib", urllib.request.build_opener()),
+                             ("keep_alive_handler", urllib.request.build_opener(module.keep_alive_handler()))):
+            spent, handshakes = run(stand_in, opener, args.pages, threads)
+            print(f"{name:18}{threads:>2}t {handshakes:>12}{spent * 1000:>10.2f}")
+    stand_in.shutdown()
+
+
+if __name__ == "__main__":
+    main()
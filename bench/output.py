@@ -0,0 +1,49 @@
+"""Rows/s of novaprinter.prettyPrinter and of the engines' batched Printer.
+
+    PYTHONPATH=<nova3> python bench/output.py [--rows 5000]
+
+Both print the same rows to devnull, as a search of that many results would.
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+import engines  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--rounds", type=int, default=5, help="the best one is shown")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        module = engines.load("megapeer", Path(workdir))
+    from novaprinter import prettyPrinter
+
+    rows = [{"engine_url": "https://megapeer.vip/", "desc_link": f"https://megapeer.vip/torrent/{i}",
+             "name": f"[24.01.01] Doctor {i}", "link": f"https://megapeer.vip/download/{i}",
+             "size": f"1.{i % 100:02d} GB", "seeds": 100, "leech": 100} for i in range(args.rows)]
+    pretty = batched = float("inf")
+    with engines.quiet():
+        for _ in range(args.rounds):
+            t0 = time.perf_counter()
+            for row in rows:
+                # prettyPrinter changes the row it's given
+                prettyPrinter(dict(row))
+            t1 = time.perf_counter()
+            printer = module.Printer()
+            for row in rows:
+                printer(row)
+            printer.flush()
+            t2 = time.perf_counter()
+            pretty, batched = min(pretty, t1 - t0), min(batched, t2 - t1)
+    print(f"{args.rows} rows: prettyPrinter {args.rows / pretty:.0f} rows/s, "
+          f"Printer {args.rows / batched:.0f} rows/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""Synthetic result pages in megapeer, rutor and rutracker markup.
+
+Rows copy the markup the engines parse, the rest of a page is cut down to the
+parts they look at. `python bench/pages.py` saves a set of them to
+bench/fixtures, the stand-in server builds them on the fly.
+"""
+import sys
+from pathlib import Path
+
+FIXTURES = Path(__file__).parent / "fixtures"
+TOTAL = 230
+
+MONTHS_MP = ("января", "февраля", "марта", "апреля", "мая", "июня",
+             "июля", "августа", "сентября", "октября", "ноября", "декабря")
+MONTHS_RT = ("Янв", "Фев", "Мар", "Апр", "Май", "Июн",
+             "Июл", "Авг", "Сен", "Окт", "Ноя", "Дек")
+
+MEGAPEER_NOT_FOUND = ('<html><span style="color:#0000FF">По вашему запросу ничего не найдено. '
+                      'Попробуйте изменить свой запрос и/или параметры поиска.</span></html>')
+MEGAPEER_ROW = (
+    '<tr><td class="row1 tLeft"><div class="topic-detail">'
+    '<span>Добавлен:</span> %d %s 2024 в 12:00'
+    '<div class="f-name">%s</div>'
+    '<a class="med tLink hl-tags bold" href="/torrent/%d">Doctor <span class="brackets-pair">[%d]</span> &amp; co</a>'
+    '<a class="gr-button tr-dl dl-stub" href="download/%d">\n1.%02d GB <img src="/pic/icon_tor_arrow.png"/></a>'
+    '</div></td></tr>')
+
+RUTOR_ROW = (
+    '<tr class="%s"><td>%02d&nbsp;%s&nbsp;24</td><td ><a class="downgif" href="//d.rutor.info/download/%d">'
+    '<img src="//s.rutor.info/i/d.gif" alt="D" /></a>'
+    '<a href="magnet:?xt=urn:btih:%040x&dn=rutor.info&tr=udp://opentor.net:6969"><img src="//s.rutor.info/i/m.png" alt="M" /></a>\n'
+    '<a href="/torrent/%d/doctor-%d">Doctor %d (c%d)</a></td>\n'
+    '<td align="right">1<img src="//s.rutor.info/i/com.gif" alt="C" /></td><td align="right">1.%02d&nbsp;GB</td>'
+    '<td align="center"><span class="green"><img src="//s.rutor.info/t/arrowup.gif" alt="S" />&nbsp;%d</span>'
+    '<img src="//s.rutor.info/t/arrowdown.gif" alt="L" /><span class="red">&nbsp;%d</span></td></tr>')
+
+RUTRACKER_CATEGORIES = (
+    '<select id="fs-main"><optgroup label="&nbsp;Кино, Видео и ТВ">'
+    '<option id="fs-7" value="7">Зарубежное кино</option>'
+    '<option id="fs-22" value="22" class=\'fp-7\'>&nbsp;|- Фильмы 2024</option>'
+    '<option id="fs-33" value="33">Мультфильмы</option>'
+    '</optgroup><optgroup label="&nbsp;Сериалы">'
+    '<option id="fs-189" value="189">Зарубежные сериалы</option>'
+    '<option id="fs-190" value="190" class=\'fp-189\'>&nbsp;|- Доктор Кто</option>'
+    '</optgroup><optgroup label="Игры">'
+    '<option id="fs-635" value="635">Игры для ПК</option>'
+    '<option id="fs-636" value="636" class=\'fp-635\'>&nbsp;|- Видео игр</option>'
+    '</optgroup><optgroup label="Программы и Дизайн">'
+    '<option id="fs-1012" value="1012">Программы для Windows</option>'
+    '</optgroup></select>')
+RUTRACKER_LOGIN = ('<html><form id="login-form-full" action="login.php" method="post">'
+                   '<input name="login_username"><input name="login_password" type="password">'
+                   '<input name="login" type="submit" value="Вход"></form></html>')
+RUTRACKER_ROW = (
+    '<tr id="trs-tr-%d" class="tCenter hl-tr" data-topic_id="%d"><td class="row1 t-ico"></td>'
+    '<td class="row4 med tLeft t-title-col tt"><div class="wbr t-title">'
+    '<a data-topic_id="%d" class="med tLink tt-text ts-text hl-tags bold" href="viewtopic.php?t=%d">Doctor &lt;%d&gt;</a></div></td>'
+    '<td class="row4 small nowrap tor-size" data-ts_text="%d"><a class="small tr-dl dl-stub" href="dl.php?t=%d">1 GB</a></td>'
+    '<td class="row4 nowrap" data-ts_text="%d"><b class="seedmed">%d</b></td>'
+    '<td class="row4 leechmed bold" title="Личи">%d</td><td class="row4 small number-format">12</td>'
+    '<td class="row4 small nowrap" data-ts_text="%d"><p>14-Nov-23</p></td></tr>')
+
+TORRENT = (b"d8:announce30:http://bt.example.org/announce13:creation datei1700000000e"
+           b"4:infod6:lengthi1024e4:name%d:%s12:piece lengthi16384e6:pieces20:" + b"a" * 20 + b"ee")
+
+
+def megapeer(rows: range, total: int = TOTAL) -> bytes:
+    """Megapeer search page with rows numbered by `rows`, 50 per page on the site."""
+    out = ['<html><table><tr><td style="padding-left: 10px;">Всего: %d</td></tr>' % total]
+    for i in rows:
+        category = "Кино, Видео и TV" if i % 2 else "Музыка"
+        out.append(MEGAPEER_ROW % (i % 28 + 1, MONTHS_MP[i % 12], category, 1000 + i, i,
+                                   1000 + i, i % 100))
+    out.append("</table></html>")
+    return "\n".join(out).encode("cp1251")
+
+
+def rutor(rows: range, total: int = TOTAL, category: int = 0) -> bytes:
+    """Rutor search page, 100 rows per page; categories give their own topic ids."""
+    out = ['<html><div id="index"><b>Поиск</b> Результатов поиска %d (max. 2000)<table>'
+           '<tr class="backgr"><td>Добавлен</td></tr>' % total]
+    for i in rows:
+        # a third of topics is in every category, so searches overlap
+        topic = 5000 + i + (category * 100000 if i % 3 else 0)
+        out.append(RUTOR_ROW % ("gai" if i % 2 else "tum", i % 28 + 1, MONTHS_RT[i % 12], topic,
+                                topic, topic, i, i, category, i % 100, (i * 7) % 97, i % 5))
+    out.append("</table></div></html>")
+    return "\n".join(out).encode()
+
+
+def rutracker(rows: range, total: int = TOTAL, forum: int = 0) -> bytes:
+    """Rutracker search page of a logged in user, 50 rows per page."""
+    out = ['<html><a id="logged-in-username" class="log-out-icon"></a>' + RUTRACKER_CATEGORIES +
+           '<p>Результатов поиска: %d <span class="normal">(max: 500)</span></p><table>' % total]
+    for i in rows:
+        topic = 9000 + i + forum * 1000
+        seeds = (i * 13) % 101 - 1
+        out.append(RUTRACKER_ROW % (topic, topic, topic, topic, i, 2**30 + i, topic, seeds, seeds,
+                                    i % 7, 1700000000 + i * 3600))
+    out.append("</table></html>")
+    return "\n".join(out).encode("cp1251")
+
+
+def torrent(topic: str) -> bytes:
+    """Small valid torrent file, padded to the size of a real one."""
+    name = topic.encode() + b".bin"
+    return TORRENT % (len(name), name) + b"x" * 20000
+
+
+def save(folder: Path = FIXTURES) -> None:
+    """Saves first, next and empty pages of every engine and the rutracker login form."""
+    pages = {
+        "megapeer_first.html": megapeer(range(0, 50)),
+        "megapeer_next.html": megapeer(range(50, 100)),
+        "megapeer_not_found.html": MEGAPEER_NOT_FOUND.encode("cp1251"),
+        "rutor_first.html": rutor(range(0, 100)),
+        "rutor_next.html": rutor(range(100, 200)),
+        "rutor_not_found.html": rutor(range(0), 0),
+        "rutracker_first.html": rutracker(range(0, 50)),
+        "rutracker_next.html": rutracker(range(50, 100)),
+        "rutracker_not_found.html": rutracker(range(0), 0),
+        "rutracker_login.html": RUTRACKER_LOGIN.encode("cp1251"),
+    }
+    folder.mkdir(exist_ok=True)
+    for name, page in pages.items():
+        (folder / name).write_bytes(page)
+        print(f"{folder / name}: {len(page)} bytes")
+
+
+if __name__ == "__main__":
+    save(*map(Path, sys.argv[1:2]))
@@ -0,0 +1,100 @@
+"""Parse time of synthetic pages of 1k, 5k and 10k rows, which should grow linearly.
+
+    PYTHONPATH=<nova3> python bench/parse.py [--rows 1000 5000 10000]
+
+Rows are parsed segment by segment as draw() does it. For rutor and
+rutracker the page-wide regex they used before is timed too, decoding
+included. On a 1k-row page with every 10th row broken, rows found and rows
+which are not on the intact page are counted; the segment parser drops the
+broken rows, the old regex merges them with the next ones.
+"""
+import argparse
+import re
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+import engines  # noqa: E402
+import pages  # noqa: E402
+
+# RE_TORRENTS of rutor and rutracker run with findall over the whole page
+OLD = {
+    "rutor": re.compile(
+        r'(?:gai|tum)"><td>(.+?)</td.+?(?:href="(magnet:[^"]+)".+?)?href="/(torrent/(\d+).+?)">(.+?)</a.+?right"'
+        r'>([.\d]+&nbsp;\w+)</td.+?alt="S"\s/>(.+?)</s.+?red">(.+?)</s', re.S),
+    "rutracker": re.compile(
+        r'<a\sdata-topic_id="(\d+?)".+?">(.+?)</a.+?tor-size"\sdata-ts_text="(\d+?)'
+        r'">.+?data-ts_text="([-0-9]+?)">.+?Личи">(\d+?)</.+?ata-ts_text="(\d+?)">', re.S),
+}
+# page of n rows and a change which breaks a row
+PAGES = {
+    "megapeer": (lambda n: pages.megapeer(range(n), n), b"gr-button tr-dl", b"gr-button"),
+    "rutor": (lambda n: pages.rutor(range(n), n), b"&nbsp;GB</td>", b" GB</td>"),
+    "rutracker": (lambda n: pages.rutracker(range(n), n), 'title="Личи"'.encode("cp1251"), b'title="L"'),
+}
+
+
+def rows_of(module):
+    """Parses a whole page the way draw() does, gives the rows found."""
+    if module.__name__ == "megapeer":
+        def parse(page: bytes) -> list:
+            rows = (module.Megapeer.extractor(page, start, stop)
+                    for start, stop in module.segments(page, module.ITEM_DIVIDER, len(page)))
+            return [row for row in rows if row is not None]
+        return parse
+    return lambda page: list(module.parse_rows(page, len(page)))
+
+
+def broken(name: str, module, n: int) -> bytes:
+    make, field, change = PAGES[name]
+    divider = module.ITEM_DIVIDER if name == "megapeer" else module.ROW_DIVIDER
+    parts = make(n).split(divider)
+    for i in range(10, len(parts), 10):
+        parts[i] = parts[i].replace(field, change, 1)
+    return divider.join(parts)
+
+
+def timed(parse, page: bytes, rounds: int) -> float:
+    best = float("inf")
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        parse(page)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 5000, 10000])
+    parser.add_argument("--rounds", type=int, default=5, help="the best one is shown")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        modules = [engines.load(name, Path(workdir) / name) for name in engines.NAMES]
+    print(f"{'':10}{'rows':>7}{'segments ms':>13}{'us/row':>8}{'findall ms':>12}{'us/row':>8}")
+    for module in modules:
+        name, parse = module.__name__, rows_of(module)
+        old = OLD.get(name)
+        old_parse = old and (lambda page: old.findall(page.decode(module.ENCODING)))
+        for n in args.rows:
+            page = PAGES[name][0](n)
+            assert len(parse(page)) == n, f"{name}: {len(parse(page))} of {n} rows parsed"
+            spent = timed(parse, page, args.rounds)
+            line = f"{name:10}{n:>7}{spent * 1000:>13.1f}{spent * 1e6 / n:>8.2f}"
+            if old_parse:
+                spent = timed(old_parse, page, args.rounds)
+                line += f"{spent * 1000:>12.1f}{spent * 1e6 / n:>8.2f}"
+            print(line)
+        line = f"{name:10}  1000 rows, every 10th broken:"
+        for method, run in (("segments", parse), ("findall", old_parse)):
+            if run:
+                intact, rows = set(map(tuple, run(PAGES[name][0](1000)))), run(broken(name, module, 1000))
+                wrong = sum(tuple(row) not in intact for row in rows)
+                line += f" {method} find {len(rows)}, {wrong} wrong;"
+        print(line.rstrip(";"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Parsing speed, search latency and peak memory of every engine.
+
+    PYTHONPATH=<nova3> python bench/run.py [--searches 20] [--latency 0.05] [--jitter 0.02]
+                                           [--total 230] [--fail 0] [--tls] [engine ...]
+
+Parsing feeds the pages in bench/fixtures through PageStream and draw() the
+way a search does. Searches run end to end against the stand-in server in
+this process, each with fresh connections like a new qBittorrent search.
+Their output is captured: rows are the mean found per search, errors are the
+searches which printed an error row. Peak memory is the tracemalloc peak of
+one parse or search.
+"""
+import argparse
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+import engines  # noqa: E402
+import pages  # noqa: E402
+import server  # noqa: E402
+
+
+def bench_parse(module, rounds: int) -> None:
+    fixtures = [path.read_bytes() for path in sorted(pages.FIXTURES.glob(module.__name__ + "_*.html"))]
+    t0 = time.perf_counter()
+    for _ in range(rounds):
+        rows = sum(engines.parse(module, page) for page in fixtures)
+    spent = (time.perf_counter() - t0) / rounds
+    size = sum(map(len, fixtures))
+    tracemalloc.start()
+    for page in fixtures:
+        engines.parse(module, page)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"{module.__name__:10}{len(fixtures):>7}{rows:>7}{rows / spent:>10.0f}"
+          f"{size / spent / 2**20:>8.1f}{peak / 1024:>10.0f}")
+
+
+def search(module, what: str) -> tuple:
+    engine = getattr(module, module.__name__)
+    # new connections and, for rutracker, cookies of a new process
+    engine.session = None
+    instance = engine()
+    t0 = time.perf_counter()
+    with engines.capture() as lines:
+        instance.search(what)
+    spent = time.perf_counter() - t0
+    # pretty_error() prints the error as a row with a link ending in "error"
+    errors = sum(line.split("|", 1)[0].endswith("error") for line in lines)
+    return spent, len(lines) - errors, errors
+
+
+def bench_search(module, stand_in: server.Server, searches: int, what: str) -> None:
+    # the first search logs in and loads rutracker categories
+    search(module, what)
+    stand_in.reset()
+    spent, rows, errors = [], 0, 0
+    for _ in range(searches):
+        seconds, found, failed = search(module, what)
+        spent.append(seconds)
+        rows, errors = rows + found, errors + bool(failed)
+    stats = dict(stand_in.stats)
+    tracemalloc.start()
+    search(module, what)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    ranks = engines.percentiles(spent)
+    print(f"{module.__name__:10}{searches:>9}{rows / searches:>6.0f}{errors:>8}"
+          + "".join(f"{s * 1000:>8.0f}" for s in (*ranks, max(spent)))
+          + f"{stats['requests'] / searches:>7.1f}{stats['connections'] / searches:>7.1f}"
+          + f"{peak / 1024:>10.0f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("engines", nargs="*", metavar="engine", help=", ".join(engines.NAMES))
+    parser.add_argument("--searches", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=20, help="parses of every fixture")
+    parser.add_argument("--what", default="doctor")
+    parser.add_argument("--total", type=int, default=pages.TOTAL, help="results of a search")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per response")
+    parser.add_argument("--jitter", type=float, default=0.02, help="+- seconds to latency")
+    parser.add_argument("--fail", type=float, default=0.0, help="share of pages answered with 503")
+    parser.add_argument("--tls", action="store_true", help="search over https")
+    args = parser.parse_args()
+    if not set(args.engines) <= set(engines.NAMES):
+        parser.error(f"engines are {', '.join(engines.NAMES)}")
+
+    stand_in = server.Server(0, args.total, args.latency, args.jitter, args.fail, args.tls).start()
+    server.trust_any_certificate()
+    with tempfile.TemporaryDirectory() as workdir:
+        modules = [engines.load(name, Path(workdir) / name, stand_in.url)
+                   for name in args.engines or engines.NAMES]
+
+        print("Parsing bench/fixtures")
+        print(f"{'':10}{'pages':>7}{'rows':>7}{'rows/s':>10}{'MB/s':>8}{'peak KiB':>10}")
+        for module in modules:
+            bench_parse(module, args.rounds)
+
+        print(f"\nSearching {args.what!r} at {stand_in.url}, {args.total} results, "
+              f"latency {args.latency * 1000:.0f}+-{args.jitter * 1000:.0f} ms, fail {args.fail:.0%}")
+        print(f"{'':10}{'searches':>9}{'rows':>6}{'errors':>8}{'p50 ms':>8}{'p90 ms':>8}"
+              f"{'p99 ms':>8}{'max ms':>8}{'reqs':>7}{'conns':>7}{'peak KiB':>10}")
+        for module in modules:
+            bench_search(module, stand_in, args.searches, args.what)
+    stand_in.shutdown()
+
+
+if __name__ == "__main__":
+    main()
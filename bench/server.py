@@ -0,0 +1,191 @@
+"""Local stand-in for megapeer, rutor and rutracker.
+
+    python bench/server.py [--port 8765] [--total 230] [--latency 0.05] [--jitter 0.02]
+                           [--fail 0.1] [--tls]
+
+Serves the search pages of bench/pages.py, torrent downloads and the rutracker
+login under the paths the engines use. Every response waits latency +- jitter
+seconds, --fail answers that share of page requests with 503. A search for
+"nothing" finds nothing. /stats gives opened connections and requests, with
+--tls each connection is a TLS handshake.
+"""
+import argparse
+import gzip
+import json
+import random
+import re
+import socket
+import ssl
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+import pages  # noqa: E402
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self) -> None:
+        self.server.count("connections")
+        super().setup()
+        # headers and body are separate writes, which must not wait for acks
+        # on a kept-alive connection, as on real servers
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def do_POST(self) -> None:
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if not self.path.startswith("/forum/login.php"):
+            return self.reply(404)
+        self.server.wait()
+        self.reply(302, headers={"Set-Cookie": "bb_session=0-1-bench; path=/forum/; domain=127.0.0.1",
+                                 "Location": "/forum/index.php"})
+
+    def do_GET(self) -> None:
+        url = urllib.parse.urlsplit(self.path)
+        if url.path == "/stats":
+            return self.reply(200, json.dumps(self.server.stats).encode())
+        self.server.count("requests")
+        self.server.wait()
+        download = url.path.startswith("/download/") or url.path == "/forum/dl.php"
+        if not download and random.random() < self.server.fail:
+            return self.reply(503)
+        query = urllib.parse.parse_qs(url.query, encoding="cp1251")
+        if url.path == "/browse.php":
+            body = self.megapeer(query)
+        elif url.path.startswith("/search/"):
+            body = self.rutor(url.path)
+        elif url.path == "/forum/tracker.php":
+            body = self.rutracker(query)
+        elif url.path == "/forum/index.php":
+            body = b"<html>index</html>"
+        elif download:
+            body = pages.torrent(re.sub(r"\D", "", url.path + url.query) or "0")
+        else:
+            return self.reply(404)
+        self.reply(200, body)
+
+    def megapeer(self, query: dict) -> bytes:
+        if query["search"][0] == "nothing":
+            return pages.MEGAPEER_NOT_FOUND.encode("cp1251")
+        total, start = self.server.total, int(query.get("page", ["0"])[0]) * 50
+        return pages.megapeer(range(start, min(total, start + 50)), total)
+
+    def rutor(self, path: str) -> bytes:
+        # /search/<page>/<category>/100/<order>/<what>
+        parts = path.split("/")
+        page, category, what = int(parts[2]), int(parts[3]), urllib.parse.unquote_plus(parts[6])
+        total = 0 if what == "nothing" else self.server.total
+        return pages.rutor(range(page * 100, min(total, page * 100 + 100)), total, category)
+
+    def rutracker(self, query: dict) -> bytes:
+        if "bb_session=" not in self.headers.get("Cookie", ""):
+            return pages.RUTRACKER_LOGIN.encode("cp1251")
+        forums = query.get("f", ["-1"])[0] or "-1"
+        start = int(query.get("start", ["0"])[0])
+        if query.get("nm", [""])[0] == "nothing":
+            total, forum = 0, 0
+        elif forums == "-1" or "," in forums:
+            # whole tracker or a shard of forums hits the cap
+            total, forum = min(500, self.server.total), 0
+        else:
+            total, forum = min(self.server.total // 3, 500), int(forums)
+        return pages.rutracker(range(start, min(total, start + 50)), total, forum)
+
+    def reply(self, status: int, body: bytes = b"", headers: dict = None) -> None:
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if body and "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = gzip.compress(body)
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port: int = 8765, total: int = pages.TOTAL, latency: float = 0.0,
+                 jitter: float = 0.0, fail: float = 0.0, tls: bool = False):
+        super().__init__(("127.0.0.1", port), Handler)
+        self.total, self.latency, self.jitter, self.fail = total, latency, jitter, fail
+        self.stats = {"connections": 0, "requests": 0}
+        self._lock = threading.Lock()
+        self.scheme = "http"
+        if tls:
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(*certificate())
+            self.socket = context.wrap_socket(self.socket, server_side=True)
+            self.scheme = "https"
+
+    @property
+    def url(self) -> str:
+        return f"{self.scheme}://127.0.0.1:{self.server_address[1]}/"
+
+    def count(self, name: str) -> None:
+        with self._lock:
+            self.stats[name] += 1
+
+    def reset(self) -> None:
+        with self._lock:
+            self.stats = dict.fromkeys(self.stats, 0)
+
+    def wait(self) -> None:
+        delay = self.latency + random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+    def start(self) -> "Server":
+        """Serves from a daemon thread, for benchmarks in the same process."""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+def certificate() -> tuple:
+    """Self-signed certificate and key for 127.0.0.1, made by openssl once."""
+    folder = Path(tempfile.gettempdir()) / "bench-tls"
+    cert, key = folder / "cert.pem", folder / "key.pem"
+    if not cert.exists():
+        folder.mkdir(exist_ok=True)
+        subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "30",
+                        "-subj", "/CN=127.0.0.1", "-keyout", str(key), "-out", str(cert)],
+                       check=True, capture_output=True)
+    return str(cert), str(key)
+
+
+def trust_any_certificate() -> None:
+    """Lets urllib accept the self-signed certificate of the stand-in."""
+    ssl._create_default_https_context = ssl._create_unverified_context
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--total", type=int, default=pages.TOTAL, help="results of a search")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="+- seconds to latency")
+    parser.add_argument("--fail", type=float, default=0.0, help="share of pages answered with 503")
+    parser.add_argument("--tls", action="store_true", help="serve https")
+    args = parser.parse_args()
+    server = Server(args.port, args.total, args.latency, args.jitter, args.fail, args.tls)
+    print(f"Serving {server.url}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
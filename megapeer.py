@@ -3,42 +3,85 @@
 
 # Megapeer.vip search engine plugin for qBittorrent
 
-import base64
+import codecs
+import heapq
 import json
 import logging
+import math
+import random
 import re
 import sys
+import threading
 import time
-from concurrent.futures.thread import ThreadPoolExecutor
+from collections import deque
+from contextlib import contextmanager
 from dataclasses import dataclass, field
 from html import unescape
 from pathlib import Path
-from tempfile import NamedTemporaryFile
-from typing import Optional, Union
-from urllib.error import URLError, HTTPError
+from typing import TYPE_CHECKING, Optional
 import urllib.parse
-import urllib.request
 
+if TYPE_CHECKING:
+    # annotations only, the first request imports them
+    import http.client
+    import urllib.request
 
 try:
-    from novaprinter import prettyPrinter
+    import fcntl
+except ImportError:  # windows
+    fcntl = None
+    import msvcrt
+
+try:
+    from novaprinter import anySizeToBytes
 except ImportError:
     sys.path.insert(0, str(Path(__file__).parent.parent.absolute()))
-    from novaprinter import prettyPrinter
+    from novaprinter import anySizeToBytes
 
 FILE = Path(__file__)
 BASEDIR = FILE.parent.absolute()
 
 FILENAME = FILE.stem
-FILE_J, FILE_C = [BASEDIR / (FILENAME + fl) for fl in (".json", ".cookie")]
+FILE_J, FILE_C, FILE_D = [BASEDIR / (FILENAME + fl) for fl in (".json", ".cookie", ".db")]
+DIR_T = BASEDIR / (FILENAME + "_torrents")
+FILE_M = BASEDIR / (FILENAME + "_metrics.jsonl")
+FILE_TRACE = BASEDIR / (FILENAME + "_trace.log")
+# state of hosts for the circuit breaker and its lock
+FILE_H, FILE_HL = BASEDIR / (FILENAME + "_hosts.json"), BASEDIR / (FILENAME + "_hosts.lock")
 
 PAGES = 50
+# keep-alive connections per host, like browsers do
+POOL_SIZE = 6
+# seconds to wait for a response
+TIMEOUT = 5
+# bytes to read from response at once
+CHUNK_SIZE = 16 * 1024
+# failed pages are requested again that many times
+PAGE_RETRIES = 1
+# error of pages which the search deadline skipped
+OUT_OF_TIME = "Search took longer than %s seconds"
+# retries wait a random time up to BACKOFF * 2 ** attempt seconds, not more than BACKOFF_MAX
+BACKOFF, BACKOFF_MAX = 0.5, 4
+# a host failing that many requests in a row is skipped for COOLDOWN seconds
+FAILURES, COOLDOWN = 3, 60
+# found torrents are printed by batches of rows or after a delay in seconds
+BATCH_SIZE, BATCH_DELAY = 100, 0.5
+LOG_FORMAT, LOG_DATEFMT = "%(asctime)s %(name)-12s %(levelname)-8s %(message)s", "%m-%d %H:%M"
+# debug records kept by a sampled search
+TRACE_SIZE = 500
 
 
 def rng(t: int) -> range:
+    # no more pages than max_results need
+    if config.max_results > 0:
+        t = min(t, config.max_results)
     return range(1, -(-t // PAGES))
 
-ITEM_DIVIDER = '<td class="row1 tLeft"><div class="topic-detail">'
+# pages are parsed undecoded, so markers are encoded too
+ENCODING = "cp1251"
+# bytes.decode() looks the codec up on every field
+DECODER = codecs.getdecoder(ENCODING)
+ITEM_DIVIDER = b'<td class="row1 tLeft"><div class="topic-detail">'
 SPLIT_ARRAY = [
                 ["<span>Добавлен:</span> ", " в "],
                 ['<div class="f-name">', "</div>"],
@@ -47,18 +90,20 @@ SPLIT_ARRAY = [
                 ['<a class="gr-button tr-dl dl-stub" href="', '">'],
                 ['\n', ' <img src="/pic/icon_tor_arrow.png"/>'],
             ]
+# a field is between its head and tail, a head is the first one after the previous field
+ROW_MARKERS = [(head.encode(ENCODING), tail.encode(ENCODING)) for head, tail in SPLIT_ARRAY]
 MOVIES_AND_TV = "Кино, Видео и TV"
-NOT_FOUND_STR = '<span style="color:#0000FF">По вашему запросу ничего не найдено. Попробуйте изменить свой запрос и/или параметры поиска.</span>'
+NOT_FOUND_STR = '<span style="color:#0000FF">По вашему запросу ничего не найдено. Попробуйте изменить свой запрос и/или параметры поиска.</span>'.encode(ENCODING)
 
-RE_RESULTS = re.compile(r'<td\sstyle="padding-left:\s10px;">Всего:\s(\d{1,4})</td>', re.S)
+RE_RESULTS = re.compile(r'<td\sstyle="padding-left:\s10px;">Всего:\s(\d{1,4})</td>'.encode(ENCODING), re.S)
+RE_TOPIC = re.compile(r"download/(\d+)")
+# month names of dates in rows
+MONTHS = {m: f"{i:02d}" for i, m in enumerate(
+    ("января", "февраля", "марта", "апреля", "мая", "июня",
+     "июля", "августа", "сентября", "октября", "ноября", "декабря"), 1)}
 PATTERNS = ("%sbrowse.php?search=%s&cat=%i",)
-
-# setup logging
-logging.basicConfig(
-    format="%(asctime)s %(name)-12s %(levelname)-8s %(message)s",
-    datefmt="%m-%d %H:%M",
-    level=logging.DEBUG
-)
+# config options which change parsed rows, cached rows are kept apart by them
+ROW_OPTIONS = ("strict_dates",)
 
 logger = logging.getLogger(__name__)
 
@@ -66,10 +111,41 @@ logger = logging.getLogger(__name__)
 @dataclass
 class Config:
     torrent_date: bool = True
+    magnet: bool = False
     proxy: bool = False
     proxies: dict = field(default_factory=lambda: {"http": "", "https": ""})
     ua: str = ("Mozilla/5.0 (X11; Linux i686; rv:38.0) Gecko/20100101 "
                "Firefox/38.0 ")
+    # how many pages are requested at once
+    threads: int = 6
+    # seconds a search can take, pages left by then are skipped, 0 waits for all
+    deadline: int = 8
+    # seconds to keep found results, 0 disables cache
+    cache_ttl: int = 600
+    # cache size limit in megabytes
+    cache_size: int = 16
+    # downloaded torrent files limit in megabytes, 0 disables
+    torrents_size: int = 64
+    # seconds a topic keeps its torrent file, updated topics are downloaded again then
+    torrents_ttl: int = 3600
+    # put [??.??.??] and a warning instead of malformed dates
+    strict_dates: bool = False
+    # print only this many torrents with most seeds, 0 prints all
+    max_results: int = 0
+    # append timings of every search to *_metrics.jsonl
+    metrics: bool = False
+    # DEBUG logs every page and request, INFO and above cost nothing on them
+    log_level: str = "INFO"
+    # share of searches which save their debug log to *_trace.log on error
+    trace_rate: float = 0.05
+
+    def __post_init__(self):
+        try:
+            if not self._validate_json(json.loads(FILE_J.read_text())):
+                raise ValueError("Incorrect json scheme.")
+        except Exception as e:
+            logger.error(e)
+            FILE_J.write_text(self.to_str())
 
     def to_str(self) -> str:
         return json.dumps(self.to_dict(), indent=4, sort_keys=False)
@@ -98,7 +174,777 @@ class Config:
                        for i, x in enumerate(s.split("_")))
 
 
-config = Config()
+class Trace(logging.Handler):
+    """Keeps recent debug records and passes the rest on as usual."""
+
+    def __init__(self, level: int, size: int = TRACE_SIZE):
+        super().__init__(logging.DEBUG)
+        self.passed = level
+        self.records = deque(maxlen=size)
+        self.setFormatter(logging.Formatter(LOG_FORMAT, LOG_DATEFMT))
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.records.append(record)
+        if record.levelno >= self.passed:
+            logging.getLogger().handle(record)
+
+    def dump(self, path: Path) -> None:
+        try:
+            with path.open("w", encoding="utf-8") as fd:
+                fd.writelines(self.format(record) + "\n" for record in list(self.records))
+        except OSError as ex:
+            logger.error("Trace failed to save: %s", ex)
+
+
+# read on first use, so importing the module has no side effects
+config: Optional[Config] = None
+config_lock = threading.Lock()
+# debug records of sampled searches
+trace: Optional[Trace] = None
+
+
+def setup() -> None:
+    """Sets up logging and reads config once, when an engine is made."""
+    global config, trace
+    with config_lock:
+        if config is not None:
+            return
+        logging.basicConfig(format=LOG_FORMAT, datefmt=LOG_DATEFMT)
+        config = Config()
+        level = logging.getLevelName(config.log_level.upper())
+        if not isinstance(level, int):
+            logger.error("Unknown log level %s", config.log_level)
+            level = logging.INFO
+        if level > logging.DEBUG and random.random() < config.trace_rate:
+            # debug records are kept aside and saved only if search fails
+            trace = Trace(level)
+            logger.addHandler(trace)
+            logger.propagate = False
+            level = logging.DEBUG
+        logger.setLevel(level)
+
+
+def segments(page: bytes, divider: bytes, end: int):
+    """(start, end) of every piece page[:end].split(divider) would give, without copies."""
+    start = 0
+    while True:
+        stop = page.find(divider, start, end)
+        if stop < 0:
+            yield start, end
+            return
+        yield start, stop
+        start = stop + len(divider)
+
+
+def row_date(text: str) -> str:
+    """'5 января 2024' -> '[24.01.05] '"""
+    parts = unescape(text).split(" ")
+    month = MONTHS.get(parts[1]) if len(parts) == 3 else None
+    if month and parts[0].isdigit() and parts[2].isdigit():
+        return f"[{parts[2][-2:]}.{month}.{parts[0].zfill(2)}] "
+    if config.strict_dates:
+        logger.warning("Malformed date: %s", text)
+        return "[??.??.??] "
+    return ""
+
+
+def bencode_end(data: bytes, i: int) -> int:
+    """Index right after the bencoded value which starts at i."""
+    kind = data[i:i + 1]
+    if kind == b"i":
+        return data.index(b"e", i) + 1
+    if kind in (b"l", b"d"):
+        i += 1
+        while data[i:i + 1] != b"e":
+            i = bencode_end(data, i)
+        return i + 1
+    colon = data.index(b":", i)
+    # a broken length must not move i back or past the end
+    if not data[i:colon].isdigit():
+        raise ValueError(f"Bad string length at {i}")
+    end = colon + 1 + int(data[i:colon])
+    if end > len(data):
+        raise ValueError(f"String at {i} is cut off")
+    return end
+
+
+def bencode_items(data: bytes):
+    """Keys of a bencoded dict with bounds of their values."""
+    if data[:1] != b"d":
+        raise ValueError("Not a dictionary")
+    i = 1
+    while data[i:i + 1] != b"e":
+        key = bencode_end(data, i)
+        end = bencode_end(data, key)
+        yield data[data.index(b":", i) + 1:key], key, end
+        i = end
+
+
+def bencode_str(value: bytes) -> str:
+    return value[value.index(b":") + 1:].decode("utf-8", "replace")
+
+
+def info_hash(data: bytes) -> Optional[str]:
+    """Hex infohash of a torrent file, None if it isn't one."""
+    import hashlib
+
+    try:
+        for key, start, end in bencode_items(data):
+            if key == b"info":
+                return hashlib.sha1(data[start:end]).hexdigest()
+    except (ValueError, RecursionError):
+        pass
+    return None
+
+
+def magnet_uri(data: bytes) -> Optional[str]:
+    """Magnet link of a torrent file with its name and tracker."""
+    infohash = info_hash(data)
+    if infohash is None:
+        return None
+    params = [("xt", f"urn:btih:{infohash}")]
+    try:
+        for key, start, end in bencode_items(data):
+            if key == b"info":
+                info = data[start:end]
+                params += [("dn", bencode_str(info[s:e]))
+                           for k, s, e in bencode_items(info) if k == b"name"]
+            elif key == b"announce":
+                params.append(("tr", bencode_str(data[start:end])))
+    except ValueError:
+        pass
+    return "magnet:?" + urllib.parse.urlencode(params, safe=":")
+
+
+class Metrics:
+    """Time spent by stages of a search and its counters."""
+
+    # draw time includes output of drawn rows, parallel pages add their times up
+    NAMES = ("total", "connect", "ttfb", "read", "decode", "draw", "output",
+             "bytes", "rows", "pages", "cached", "retries")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.values = dict.fromkeys(self.NAMES, 0)
+
+    def add(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self.values[name] += value
+
+    def reset(self) -> None:
+        with self._lock:
+            self.values = dict.fromkeys(self.NAMES, 0)
+
+    @contextmanager
+    def timer(self, name: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - t0)
+
+    def save(self, path: Path, engine: str, what: str) -> None:
+        record = {"time": round(time.time()), "engine": engine, "what": what}
+        record.update((k, round(v, 6)) for k, v in self.values.items())
+        try:
+            # a single write of a line is atomic in append mode
+            with path.open("a", encoding="utf-8") as fd:
+                fd.write(json.dumps(record, ensure_ascii=False) + "\n")
+        except OSError as ex:
+            logger.error("Metrics failed to save: %s", ex)
+
+
+class ConnectionPool:
+    """Idle keep-alive connections per host with bounded checkout."""
+
+    def __init__(self, size: int = POOL_SIZE):
+        self.size = size
+        self._lock = threading.Lock()
+        self._idle: dict = {}
+        self._slots: dict = {}
+
+    def checkout(self, key: tuple, factory) -> tuple:
+        with self._lock:
+            slots = self._slots.setdefault(key, threading.BoundedSemaphore(self.size))
+        slots.acquire()
+        with self._lock:
+            if self._idle.get(key):
+                return self._idle[key].pop(), True
+        try:
+            return factory(), False
+        except Exception:
+            slots.release()
+            raise
+
+    def checkin(self, key: tuple, conn: "http.client.HTTPConnection", reusable: bool) -> None:
+        if reusable:
+            with self._lock:
+                self._idle.setdefault(key, []).append(conn)
+        else:
+            conn.close()
+        self._slots[key].release()
+
+
+def keep_alive_handler(pool_size: int = POOL_SIZE) -> "urllib.request.BaseHandler":
+    """HTTP(S) handler which keeps connections open between requests.
+
+    urllib.request and http.client take most of the import time, so they are
+    imported by the first request and not when qBittorrent lists engines.
+    """
+    import http.client
+    import socket
+    import urllib.request
+    from urllib.error import URLError
+
+    class PooledResponse(http.client.HTTPResponse):
+        release = None
+
+        def close(self) -> None:
+            # connection can be reused only if the body was read till the end
+            reusable = self.fp is None and not self.will_close
+            super().close()
+            if self.release is not None:
+                release, self.release = self.release, None
+                release(reusable)
+
+    class KeepAliveHandler(urllib.request.HTTPHandler, urllib.request.HTTPSHandler):
+        def __init__(self, pool_size: int = POOL_SIZE):
+            super().__init__()
+            self.pool = ConnectionPool(pool_size)
+
+        def do_open(self, http_class, req, **http_conn_args):
+            host = req.host
+            if not host:
+                raise URLError("no host given")
+
+            headers = dict(req.unredirected_hdrs)
+            headers.update({k: v for k, v in req.headers.items() if k not in headers})
+            headers["Connection"] = "keep-alive"
+            headers = {name.title(): val for name, val in headers.items()}
+            tunnel_headers = {}
+            if req._tunnel_host and "Proxy-Authorization" in headers:
+                tunnel_headers["Proxy-Authorization"] = headers.pop("Proxy-Authorization")
+
+            def connect():
+                logger.debug("New connection to %s", host)
+                conn = http_class(host, timeout=req.timeout, **http_conn_args)
+                if req._tunnel_host:
+                    conn.set_tunnel(req._tunnel_host, headers=tunnel_headers)
+                conn.response_class = PooledResponse
+                return conn
+
+            key = (http_class, host, req._tunnel_host)
+            while True:
+                conn, reused = self.pool.checkout(key, connect)
+                if reused:
+                    conn.timeout = req.timeout
+                    if conn.sock is not None:
+                        conn.sock.settimeout(req.timeout)
+                try:
+                    t0 = time.perf_counter()
+                    if conn.sock is None:
+                        # dns lookup, tcp and tls handshakes
+                        conn.connect()
+                    t1 = time.perf_counter()
+                    conn.request(req.get_method(), req.selector, req.data, headers,
+                                 encode_chunked=req.has_header("Transfer-encoding"))
+                    r = conn.getresponse()
+                    t2 = time.perf_counter()
+                except (OSError, http.client.HTTPException) as err:
+                    self.pool.checkin(key, conn, False)
+                    # server could close idle connection, so try a fresh one,
+                    # but a slow server won't get faster
+                    if reused and not isinstance(err, socket.timeout):
+                        continue
+                    raise URLError(err)
+                break
+
+            r.url = req.get_full_url()
+            r.msg = r.reason
+            r.release = lambda reusable: self.pool.checkin(key, conn, reusable)
+            r.timings = {"connect": t1 - t0, "ttfb": t2 - t1}
+            return r
+
+    return KeepAliveHandler(pool_size)
+
+
+class Cache:
+    """Parsed result pages in sqlite with TTL and LRU eviction."""
+
+    def __init__(self, path: Path, ttl: int, size: int):
+        import sqlite3
+
+        self.ttl, self.size = ttl, size
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=5, check_same_thread=False)
+        self._db.executescript(
+            "CREATE TABLE IF NOT EXISTS pages (key TEXT PRIMARY KEY, "
+            "total INTEGER, rows TEXT, size INTEGER, created REAL, used REAL);"
+            "CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, "
+            "value INTEGER);"
+        )
+
+    def get(self, key: str) -> Optional[tuple]:
+        import sqlite3
+
+        now = time.time()
+        try:
+            with self._lock, self._db:
+                found = self._db.execute(
+                    "SELECT total, rows, size FROM pages WHERE key = ? AND created > ?",
+                    (key, now - self.ttl)).fetchone()
+                if found is None:
+                    self._count("misses")
+                    return None
+                self._db.execute("UPDATE pages SET used = ? WHERE key = ?", (now, key))
+                self._count("hits")
+                self._count("saved", found[2])
+            return found[0], json.loads(found[1])
+        except sqlite3.Error as ex:
+            logger.error("Cache get failed: %s", ex)
+        return None
+
+    def put(self, key: str, total: int, rows: list, size: int) -> None:
+        import sqlite3
+
+        now, data = time.time(), json.dumps(rows, ensure_ascii=False)
+        try:
+            with self._lock, self._db:
+                self._db.execute("INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?)",
+                                 (key, total, data, size, now, now))
+                self._db.execute("DELETE FROM pages WHERE created <= ?", (now - self.ttl,))
+                # evict least recently used pages above the size limit
+                kept, stale = 0, []
+                for k, length in self._db.execute(
+                        "SELECT key, length(rows) FROM pages ORDER BY used DESC"):
+                    kept += length
+                    if kept > self.size:
+                        stale.append((k,))
+                self._db.executemany("DELETE FROM pages WHERE key = ?", stale)
+        except sqlite3.Error as ex:
+            logger.error("Cache put failed: %s", ex)
+
+    def stats(self) -> dict:
+        import sqlite3
+
+        try:
+            with self._lock:
+                result = dict(self._db.execute("SELECT name, value FROM stats"))
+                result.update(zip(("pages", "bytes"), self._db.execute(
+                    "SELECT count(*), coalesce(sum(length(rows)), 0) FROM pages").fetchone()))
+            return result
+        except sqlite3.Error as ex:
+            logger.error("Cache stats failed: %s", ex)
+        return {}
+
+    def _count(self, name: str, value: int = 1) -> None:
+        self._db.execute("INSERT INTO stats VALUES (?, ?) ON CONFLICT(name) "
+                         "DO UPDATE SET value = value + excluded.value", (name, value))
+
+
+class TorrentCache:
+    """Downloaded torrent files named by infohash, bounded by total size."""
+
+    def __init__(self, db: Path, folder: Path, size: int, ttl: int):
+        import sqlite3
+
+        self.folder, self.size, self.ttl = folder, size, ttl
+        self.folder.mkdir(exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db, timeout=5, check_same_thread=False)
+        self._db.executescript(
+            # topics are taken for ttl seconds, the same infohash is the same file forever
+            "DROP TABLE IF EXISTS torrents;"
+            "CREATE TABLE IF NOT EXISTS topics (key TEXT PRIMARY KEY, infohash TEXT, added REAL);"
+            "CREATE TABLE IF NOT EXISTS files (infohash TEXT PRIMARY KEY, "
+            "size INTEGER, used REAL);"
+        )
+
+    def get(self, key: str) -> Optional[Path]:
+        """Cached file by topic id or infohash."""
+        import sqlite3
+
+        try:
+            with self._lock, self._db:
+                found = self._db.execute(
+                    "SELECT infohash FROM topics WHERE key = ? AND added > ? UNION "
+                    "SELECT infohash FROM files WHERE infohash = ?",
+                    (key, time.time() - self.ttl, key)).fetchone()
+                if found is None:
+                    return None
+                path = self.folder / f"{found[0]}.torrent"
+                # qBittorrent may remove the file after adding it
+                if not path.is_file():
+                    self._forget([found])
+                    return None
+                self._db.execute("UPDATE files SET used = ? WHERE infohash = ?",
+                                 (time.time(), found[0]))
+            return path
+        except sqlite3.Error as ex:
+            logger.error("Torrent cache get failed: %s", ex)
+        return None
+
+    def put(self, key: str, data: bytes) -> Optional[Path]:
+        import sqlite3
+
+        infohash = info_hash(data)
+        if infohash is None:
+            logger.error("%s is not a torrent file", key)
+            return None
+        if len(data) > self.size:
+            # it would push itself out of the cache
+            logger.debug("%s is too big to cache", key)
+            return None
+        path = self.folder / f"{infohash}.torrent"
+        try:
+            with self._lock, self._db:
+                tmp = path.with_suffix(".tmp")
+                tmp.write_bytes(data)
+                tmp.replace(path)
+                self._db.execute("INSERT OR REPLACE INTO topics VALUES (?, ?, ?)",
+                                 (key, infohash, time.time()))
+                self._db.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?)",
+                                 (infohash, len(data), time.time()))
+                # delete least recently used files above the size limit
+                kept, stale = 0, []
+                for row in self._db.execute("SELECT infohash, size FROM files ORDER BY used DESC"):
+                    kept += row[1]
+                    if kept > self.size:
+                        stale.append(row[:1])
+                self._forget(stale)
+            return path
+        except (OSError, sqlite3.Error) as ex:
+            logger.error("Torrent cache put failed: %s", ex)
+        return None
+
+    def _forget(self, stale: list) -> None:
+        for (infohash,) in stale:
+            (self.folder / f"{infohash}.torrent").unlink(missing_ok=True)
+        self._db.executemany("DELETE FROM topics WHERE infohash = ?", stale)
+        self._db.executemany("DELETE FROM files WHERE infohash = ?", stale)
+
+
+class TopRows:
+    """Keeps rows with most seeds, newest first on a tie, and prints them on flush."""
+
+    def __init__(self, output, size: int):
+        self.output, self.size = output, size
+        self._lock = threading.Lock()
+        self._heap, self._count = [], 0
+
+    def __call__(self, row: dict) -> None:
+        # errors are always shown
+        if row["link"].endswith("error"):
+            return self.output(row)
+        try:
+            seeds = int(str(row["seeds"]).strip())
+        except ValueError:
+            seeds = 0
+        date = row["name"][:10] if row["name"].startswith("[") else ""
+        with self._lock:
+            self._count += 1
+            item = (seeds, date, -self._count, row)
+            if len(self._heap) < self.size:
+                heapq.heappush(self._heap, item)
+            else:
+                heapq.heappushpop(self._heap, item)
+
+    def flush(self) -> None:
+        with self._lock:
+            rows, self._heap = sorted(self._heap, reverse=True), []
+        for item in rows:
+            self.output(item[-1])
+        self.output.flush()
+
+
+class PageStream:
+    """Feeds complete rows of a page to draw() while it's downloading."""
+
+    def __init__(self, draw, divider: bytes, metrics: Metrics):
+        self.draw, self.divider, self.metrics = draw, divider, metrics
+        self.tail, self.rows = b"", []
+
+    def feed(self, chunk: bytes) -> None:
+        start = max(0, len(self.tail) - len(self.divider))
+        self.tail += chunk
+        # everything before the last divider are finished rows, they are
+        # parsed in place and only found fields get decoded
+        cut = self.tail.rfind(self.divider, start)
+        if cut > 0:
+            with self.metrics.timer("draw"):
+                self.rows += self.draw(self.tail, cut)
+            self.tail = self.tail[cut:]
+
+    def close(self) -> list:
+        with self.metrics.timer("draw"):
+            self.rows += self.draw(self.tail, len(self.tail))
+        self.tail = b""
+        return self.rows
+
+
+def backoff(attempt: int) -> float:
+    """Seconds before a retry, random so retries of threads and processes spread out."""
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF * 2 ** attempt))
+
+
+class RequestError(Exception):
+    """Request failed, the message is shown to the user."""
+
+    def __init__(self, message: str, down: bool = False):
+        super().__init__(message)
+        # the host failed rather than the request, so the breaker counts it
+        self.down = down
+
+
+@dataclass
+class PageResult:
+    """What a page request gave, one failed page doesn't fail the rest."""
+    url: str
+    rows: list = field(default_factory=list)
+    # results count found on a first page
+    total: Optional[int] = None
+    cached: bool = False
+    latency: float = 0.0
+    error: Optional[str] = None
+    # the host failed, the breaker counts the page once its retries are over
+    down: bool = False
+
+    @property
+    def status(self) -> str:
+        return "failed" if self.error else "cached" if self.cached else "ok"
+
+
+class Pages:
+    """Requests pages on a pool, retries failed ones and yields the rest as they finish."""
+
+    def __init__(self, executor, fetch, deadline: Optional[float] = None,
+                 breaker: Optional["Breaker"] = None, retries: int = PAGE_RETRIES,
+                 metrics: Optional[Metrics] = None):
+        self.executor, self.fetch, self.retries = executor, fetch, retries
+        self.metrics = metrics
+        # time.monotonic() when the rest of pages are skipped
+        self.deadline = deadline
+        # failed pages go there, one count per page however many tries it took
+        self.breaker = breaker
+        self.futures, self.done = {}, []
+
+    def submit(self, url: str, first: bool = False, tag=None) -> None:
+        """Queues a page, tag comes back with its result."""
+        if self.expired():
+            self.done.append(PageResult(url, error=OUT_OF_TIME % config.deadline))
+            return
+        self._submit(url, first, tag, self.retries)
+
+    def expired(self) -> bool:
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    def _submit(self, url: str, first: bool, tag, retries: int, delay: float = 0) -> None:
+        self.futures[self.executor.submit(self._run, url, first, delay)] = (url, first, tag, retries)
+
+    def _run(self, url: str, first: bool, delay: float) -> PageResult:
+        if self.deadline is not None:
+            delay = min(delay, self.deadline - time.monotonic())
+        if delay > 0:
+            time.sleep(delay)
+        t0 = time.time()
+        try:
+            page = self.fetch(url, first)
+        except Exception as ex:
+            # anything unexpected fails this page and not the whole search
+            logger.exception("%s failed: %s", url, ex)
+            page = PageResult(url, error=f"{url} failed: {ex}")
+        page.latency = time.time() - t0
+        return page
+
+    def __iter__(self):
+        from concurrent.futures import FIRST_COMPLETED, wait
+
+        # pages can be submitted while results are handled
+        while self.futures:
+            if self.expired():
+                # running requests stop on their own, queued ones never start
+                for future, (url, *_) in self.futures.items():
+                    future.cancel()
+                    self.done.append(PageResult(url, error=OUT_OF_TIME % config.deadline))
+                self.futures = {}
+                return
+            left = None if self.deadline is None else self.deadline - time.monotonic()
+            finished, _ = wait(self.futures, left, FIRST_COMPLETED)
+            for future in finished:
+                url, first, tag, retries = self.futures.pop(future)
+                page = future.result()
+                logger.debug("%s: %s in %.2f seconds", url, page.status, page.latency)
+                if page.error and retries > 0 and not self.expired():
+                    logger.debug("Retrying %s: %s", url, page.error)
+                    if self.metrics:
+                        self.metrics.add("retries")
+                    self._submit(url, first, tag, retries - 1, backoff(self.retries - retries))
+                    continue
+                self.done.append(page)
+                if page.down and self.breaker:
+                    self.breaker.record(url, False)
+                yield tag, page
+
+    def report(self) -> Optional[str]:
+        """Error to show, if any page failed."""
+        failed = [page for page in self.done if page.error]
+        if not failed:
+            return None
+        if len(failed) == len(self.done):
+            return failed[0].error
+        # rows of the other pages are shown anyway
+        return f"{len(failed)} of {len(self.done)} pages failed: {failed[0].error}"
+
+
+class Printer:
+    """Collects found torrents and prints them in batches like novaprinter."""
+
+    def __init__(self, size: int = BATCH_SIZE, delay: float = BATCH_DELAY,
+                 metrics: Optional[Metrics] = None):
+        self.size, self.delay, self.metrics = size, delay, metrics
+        self._lock = threading.Lock()
+        self._lines, self._last = [], 0.0
+        # prints rows left in the batch when no more come for a while
+        self._timer: Optional[threading.Timer] = None
+
+    def __call__(self, row: dict) -> None:
+        t0 = time.perf_counter()
+        line = "|".join((row["link"],
+                         row["name"].replace("|", " "),
+                         str(anySizeToBytes(row["size"])),
+                         str(row["seeds"]),
+                         str(row["leech"]),
+                         row["engine_url"],
+                         row.get("desc_link", "")))
+        with self._lock:
+            self._lines.append(line)
+            if (len(self._lines) >= self.size
+                    or time.monotonic() - self._last >= self.delay):
+                self._write()
+            elif self._timer is None:
+                self._timer = threading.Timer(self._last + self.delay - time.monotonic(),
+                                              self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if self.metrics:
+            self.metrics.add("rows")
+            self.metrics.add("output", time.perf_counter() - t0)
+
+    def flush(self) -> None:
+        with self._lock:
+            self._write()
+
+    def _write(self) -> None:
+        self._last = time.monotonic()
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._lines:
+            return
+        lines, self._lines = self._lines, []
+        # fd 1 is stdout
+        with open(1, "w", encoding="utf-8", closefd=False) as utf8stdout:
+            utf8stdout.write("\n".join(lines) + "\n")
+
+
+class FileLock:
+    """Exclusive lock shared by all processes using the same file."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._fd = None
+
+    def __enter__(self):
+        self._fd = open(self.path, "a+b")
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        else:
+            self._fd.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(self._fd.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:  # gave up after 10 seconds, so try again
+                    continue
+        return self
+
+    def __exit__(self, *args):
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        else:
+            self._fd.seek(0)
+            msvcrt.locking(self._fd.fileno(), msvcrt.LK_UNLCK, 1)
+        self._fd.close()
+
+
+class Breaker:
+    """Stops requests to a failing host for a while, in all processes at once."""
+
+    def __init__(self, path: Path, lock: Path):
+        self.path, self.lock = path, lock
+        # hosts this process probes after their cool-down
+        self.probes = set()
+
+    def _load(self) -> dict:
+        try:
+            return json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self, hosts: dict) -> None:
+        if hosts:
+            self.path.write_text(json.dumps(hosts))
+        elif self.path.exists():
+            self.path.unlink()
+
+    def check(self, url: str) -> None:
+        """Raises RequestError while the host of url is cooling down."""
+        host = urllib.parse.urlsplit(url).netloc
+        # no file means every host is fine
+        if host in self.probes or not self.path.exists():
+            return
+        try:
+            with FileLock(self.lock):
+                hosts = self._load()
+                state = hosts.get(host)
+                if not state or state["failures"] < FAILURES:
+                    return
+                now = time.time()
+                # after cool-down one request checks if the host is back
+                wait = max(state["until"], state.get("probe", 0)) - now
+                if wait > 0:
+                    raise RequestError(f"{host} is not responding, next try in {wait:.0f} seconds")
+                state["probe"] = now + TIMEOUT
+                self._save(hosts)
+        except OSError as ex:
+            # state which can't be kept never stops requests
+            logger.error("Breaker failed: %s", ex)
+            return
+        self.probes.add(host)
+        logger.info("Checking if %s is back", host)
+
+    def record(self, url: str, ok: bool) -> None:
+        """Counts a request result after its retries, FAILURES in a row start a cool-down."""
+        host = urllib.parse.urlsplit(url).netloc
+        if ok and host not in self.probes and not self.path.exists():
+            return
+        try:
+            with FileLock(self.lock):
+                hosts = self._load()
+                if ok:
+                    hosts.pop(host, None)
+                else:
+                    state = hosts.setdefault(host, {"failures": 0, "until": 0})
+                    state["failures"] += 1
+                    state.pop("probe", None)
+                    if state["failures"] >= FAILURES:
+                        state["until"] = time.time() + COOLDOWN
+                        logger.warning("%s failed %s requests in a row, it is skipped for %s seconds",
+                                       host, state["failures"], COOLDOWN)
+                self._save(hosts)
+        except OSError as ex:
+            logger.error("Breaker failed: %s", ex)
+        self.probes.discard(host)
 
 
 class Megapeer:
@@ -117,12 +963,34 @@ class Megapeer:
 
     # error message
     error: Optional[str] = None
+    # time.monotonic() when the search has to end
+    deadline: Optional[float] = None
     # establish connection
-    session = urllib.request.build_opener()
+    session: Optional["urllib.request.OpenerDirector"] = None
 
     torrents: dict = {}
 
     def __init__(self):
+        # qBittorrent makes engines to list their names and categories as well,
+        # so the rest waits for the first search or download
+        self.ready = False
+
+    def prepare(self) -> None:
+        """Reads config, opens session and caches once, on the first search or download."""
+        import sqlite3
+        import urllib.request
+
+        if self.ready:
+            return
+        self.ready = True
+        setup()
+        # connections are kept for the whole process
+        if self.session is None:
+            Megapeer.session = urllib.request.build_opener(keep_alive_handler())
+
+        # timings and counters of this search
+        self.metrics = Metrics()
+
         # add proxy handler if needed
         if config.proxy:
             if any(config.proxies.values()):
@@ -131,109 +999,228 @@ class Megapeer:
             else:
                 self.error = "Proxy enabled, but not set!"
 
+        # found torrents go there
+        self.output = Printer(metrics=self.metrics)
+        if config.max_results > 0:
+            # the best ones are known only when search is over
+            self.output = TopRows(self.output, config.max_results)
+
         # change user-agent
-        self.session.addheaders = [("User-Agent", config.ua), ("Referer", self.url + "browse.php")]
+        self.session.addheaders = [("User-Agent", config.ua),
+                                    ("Accept-Encoding", "gzip, deflate"),
+                                    ("Referer", self.url + "browse.php")]
+        # topic ids which are already shown
+        self._seen, self._lock = set(), threading.Lock()
+        # failing trackers are skipped for a while
+        self.breaker = Breaker(FILE_H, FILE_HL)
+
+        # open results cache
+        self.cache = None
+        if config.cache_ttl > 0:
+            try:
+                self.cache = Cache(FILE_D, config.cache_ttl, config.cache_size << 20)
+            except sqlite3.Error as ex:
+                logger.error("Cache is not available: %s", ex)
+
+        # keep downloaded torrent files
+        self.torrent_cache = None
+        if config.torrents_size > 0:
+            try:
+                self.torrent_cache = TorrentCache(FILE_D, DIR_T, config.torrents_size << 20,
+                                                  config.torrents_ttl)
+            except (OSError, sqlite3.Error) as ex:
+                logger.error("Torrent cache is not available: %s", ex)
 
     def search(self, what: str, cat: str = "all") -> None:
+        if self.ready:
+            # every search shows and counts only its own rows
+            self._seen = set()
+            self.metrics.reset()
+        self.prepare()
         if self.error:
             self.pretty_error(what)
             return None
+        try:
+            # a tracker which is down fails at once instead of on timeouts
+            self.breaker.check(self.url)
+        except RequestError as err:
+            self.error = str(err)
+            self.pretty_error(what)
+            return None
         what = urllib.parse.quote_plus(urllib.parse.unquote(what), encoding='cp1251')
         query = PATTERNS[0] % (self.url, what, self.supported_categories[cat])
 
         cat_filter = MOVIES_AND_TV if cat in ("movies", "tv") else None
 
-        # make first request (maybe it enough)
-        t0, total = time.time(), self.searching(query, cat_filter, True)
+        t0, total = time.time(), 0
+        if config.deadline > 0:
+            self.deadline = time.monotonic() + config.deadline
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max(config.threads, 1)) as executor:
+            pages = Pages(executor, lambda url, first: self.searching(url, cat_filter, first),
+                          self.deadline, self.breaker, metrics=self.metrics)
+            # make first request (maybe it enough)
+            pages.submit(query, True)
+            for _, page in pages:
+                if page.total is None:
+                    continue
+                total = page.total
+                # do async requests
+                for x in rng(total):
+                    pages.submit(f"{query}&page={x}")
+
+        self.deadline = None
+        self.error = pages.report()
         if self.error:
             self.pretty_error(what)
+        self.output.flush()
+        logger.debug("--- %s seconds ---", time.time() - t0)
+        self.metrics.add("total", time.time() - t0)
+        logger.debug("Metrics: %s", self.metrics.values)
+        if config.metrics:
+            self.metrics.save(FILE_M, self.name, what)
+        logger.info("Found torrents: %s", total)
+        if self.cache and logger.isEnabledFor(logging.INFO):
+            # stats are a query, so they are read only when shown
+            logger.info("Cache stats: %s", self.cache.stats())
+
+    def download_torrent(self, url: str) -> None:
+        self.prepare()
+        if config.magnet:
+            # qBittorrent takes magnet links instead of files as well
+            response = self._request(url)
+            magnet = response and magnet_uri(response)
+            if not magnet:
+                self.error = self.error or f"{url} is not a torrent file"
+                self.pretty_error(url)
+                return None
+            logger.debug("%s %s", magnet, url)
+            print(f"{magnet} {url}")
+            return None
+
+        path = self.fetch_torrent(url)
+        if path is None:
+            self.pretty_error(url)
             return None
-        # do async requests
-        if total > PAGES:
-            query = query + "&page={}"
-            qrs = [(query.format(x), cat_filter) for x in rng(total)]
-            with ThreadPoolExecutor(len(qrs)) as executor:
-                executor.map(self.searching_wrapper, qrs, timeout=30)
 
-        logger.debug(f"--- {time.time() - t0} seconds ---")
-        logger.info(f"Found torrents: {total}")
+        # return file path
+        logger.debug("%s %s", path, url)
+        print(f"{path} {url}")
+
+    def download_torrents(self, topics: list) -> dict:
+        """Downloads torrents by topic ids or urls at once."""
+        self.prepare()
+        urls = [str(t) if str(t).startswith("http") else f"{self.url_dl}{t}" for t in topics]
+        if not urls:
+            return {}
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(min(len(urls), max(config.threads, 1))) as executor:
+            paths = dict(zip(urls, executor.map(self.fetch_torrent, urls)))
+        for url, path in paths.items():
+            if path is None:
+                logger.error("%s failed to download", url)
+            else:
+                print(f"{path} {url}")
+        return paths
+
+    def fetch_torrent(self, url: str) -> Optional[Path]:
+        topic = RE_TOPIC.search(url)
+        key = topic[1] if topic else url
+        path = self.torrent_cache and self.torrent_cache.get(key)
+        if path:
+            logger.debug("%s is taken from cache", url)
+            return path
 
-    def download_torrent(self, url: str) -> None:
         # Download url
         response = self._request(url)
-        if self.error:
-            self.pretty_error(url)
+        if response is None:
             return None
 
+        path = self.torrent_cache and self.torrent_cache.put(key, response)
+        if path:
+            return path
         # Create a torrent file
+        from tempfile import NamedTemporaryFile
+
         with NamedTemporaryFile(suffix=".torrent", delete=False) as fd:
             fd.write(response)
+        return Path(fd.name)
 
-            # return file path
-            logger.debug(fd.name + " " + url)
-            print(fd.name + " " + url)
+    def cache_key(self, query: str) -> str:
+        # the same page gives other rows with other options
+        options = " ".join(f"{name}={getattr(config, name)}" for name in ROW_OPTIONS)
+        return f"{self.name} {query} {options}"
 
-    def searching_wrapper(self, args):
-        return self.searching(*args)
+    def searching(self, query: str, cat_filter, first: bool = False) -> PageResult:
+        page = PageResult(query)
+        key = self.cache_key(f"{query} {cat_filter}")
+        cached = self.cache and self.cache.get(key)
+        if cached:
+            self.metrics.add("cached")
+            for row in cached[1]:
+                self.print_row(row)
+            page.total = cached[0] if first else None
+            page.rows, page.cached = cached[1], True
+            return page
 
-    def searching(self, query: str, cat_filter, first: bool = False) -> Union[None, int]:
-        logger.debug(f"searching {query}")
-        response = self._request(query)
-        if self.error:
-            return None
+        logger.debug("searching %s", query)
+        # rows are drawn while page is downloading
+        stream = PageStream(lambda page, end: self.draw(page, cat_filter, end), ITEM_DIVIDER,
+                            self.metrics)
+        try:
+            response = self._fetch(query, on_chunk=stream.feed)
+        except RequestError as err:
+            page.error, page.down = str(err), err.down
+            return page
+        self.metrics.add("pages")
         # with open('searching.htm', 'wb') as f:
         #     f.write(response)
-        page, torrents_found = response.decode('cp1251'), -1
+        page.rows = stream.close()
         if first:
             # firstly we check if there is a result
-            result = RE_RESULTS.search(page)
+            result = RE_RESULTS.search(response)
             if not result:
-                if NOT_FOUND_STR in page:
-                    return 0
-                self.error = "Unexpected page content"
-                return None
-            torrents_found = int(result[1])
-            if not torrents_found:
-                return 0
-        self.draw(page, cat_filter)
+                if NOT_FOUND_STR not in response:
+                    page.error = "Unexpected page content"
+                    return page
+                page.total = 0
+            else:
+                page.total = int(result[1])
+        if self.cache:
+            self.cache.put(key, -1 if page.total is None else page.total, page.rows, len(response))
 
-        return torrents_found
+        return page
     
     @staticmethod
-    def extractor(item, splitters):
-        result = []
-        for splitter in splitters:
-            if splitter[0] == '':
-                items = ['', item]
-            else:
-                items = item.split(splitter[0], 1)
-            if(len(items)) < 2:
-                break
-            data = items[1].split(splitter[1], 1)
-            result.append(data[0])
-            if(len(data)) < 2:
-                break
-            item = data[1]
-        return result
-
-    def draw(self, html: str, cat_filter) -> None:
-        splitted = html.split(ITEM_DIVIDER)
-        for item in splitted:
-            result = self.extractor(item, SPLIT_ARRAY)
-            if len(result) < len(SPLIT_ARRAY):
+    def extractor(page: bytes, start: int, stop: int) -> Optional[list]:
+        """Fields of the row in page[start:stop], None if it lacks any of them."""
+        bounds = []
+        for head, tail in ROW_MARKERS:
+            # every marker is looked for once, so a broken row costs one pass
+            start = page.find(head, start, stop)
+            if start < 0:
+                return None
+            start += len(head)
+            found = page.find(tail, start, stop)
+            if found < 0:
+                return None
+            bounds.append((start, found))
+            start = found + len(tail)
+        return [DECODER(page[start:end])[0] for start, end in bounds]
+
+    def draw(self, page: bytes, cat_filter, end: int) -> list:
+        rows = []
+        for start, stop in segments(page, ITEM_DIVIDER, end):
+            result = self.extractor(page, start, stop)
+            if result is None:
                 continue
 
-            ct = unescape(result[0]).split(" ")
-            months = ("января", "февраля", "марта", "апреля", "мая", "июня",
-                      "июля", "августа", "сентября", "октября", "ноября", "декабря")
-            for i, m in enumerate(months, 1):
-                if m in ct[1]:
-                    ct[1] = ct[1].replace(m, f"{i:02d}")
-                    break
-            ct = "[" + ct[2][-2:] + "." + ct[1] + "." + ("0" + ct[0])[-2:] + "] "
+            ct = row_date(result[0])
 
             if cat_filter is None or cat_filter in result[1]:
-                prettyPrinter({
+                row = {
                     "engine_url": self.url,
                     "desc_link": self.url + result[2],
                     "name": ct + unescape(result[3].replace('<span class="brackets-pair">',"").replace("</span>","")),
@@ -241,46 +1228,209 @@ class Megapeer:
                     "size": result[5],
                     "seeds": 100,
                     "leech": 100
-                })
+                }
+                rows.append(row)
+                self.print_row(row)
+
+        return rows
 
-    def _request(
-            self, url: str, data: Optional[bytes] = None, repeated: bool = False
-    ) -> Union[bytes, None]:
+    def print_row(self, row: dict) -> None:
+        # download link identifies the topic
+        with self._lock:
+            if row["link"] in self._seen:
+                return
+            self._seen.add(row["link"])
+        self.output(row)
+
+    def _request(self, url: str, data: Optional[bytes] = None, on_chunk=None) -> Optional[bytes]:
+        """_fetch() which keeps its error for pretty_error()."""
+        try:
+            return self._fetch(url, data, on_chunk=on_chunk)
+        except RequestError as err:
+            if err.down:
+                self.breaker.record(url, False)
+            self.error = str(err)
+            return None
+
+    def _fetch(
+            self, url: str, data: Optional[bytes] = None, on_chunk=None
+    ) -> bytes:
+        import http.client
+        import socket
+        import zlib
+        from urllib.error import URLError, HTTPError
+
+        self.breaker.check(url)
+        timeout = self.timeout()
         try:
-            with self.session.open(url, data, 5) as r:
+            with self.session.open(url, data, timeout) as r:
                 # checking that tracker isn't blocked
                 if r.geturl().startswith((self.url, self.url_dl)):
-                    return r.read()
-                self.error = f"{url} is blocked. Try another proxy."
+                    response = self._read(r, on_chunk)
+                    self.breaker.record(url, True)
+                    return response
+                raise RequestError(f"{url} is blocked. Try another proxy.")
+        except zlib.error as err:
+            logger.error("%s: %s", url, err)
+            raise RequestError(f"Response from {url} is corrupted") from err
         except (URLError, HTTPError) as err:
+            if isinstance(err, HTTPError):
+                # give connection back to the pool
+                err.close()
             logger.error(err.reason)
             error = str(err.reason)
-            if "timed out" in error and not repeated:
-                logger.debug("Repeating request...")
-                return self._request(url, data, True)
             if "no host given" in error:
-                self.error = "Proxy is bad, try another!"
-            elif hasattr(err, "code"):
-                self.error = f"Request to {url} failed with status: {err.code}"
-            else:
-                self.error = f"{url} is not response! Maybe it is blocked."
+                raise RequestError("Proxy is bad, try another!") from err
+            if hasattr(err, "code"):
+                if err.code < 500:
+                    # the host is up, only the request is wrong
+                    self.breaker.record(url, True)
+                # server errors mean it's overloaded
+                raise RequestError(f"Request to {url} failed with status: {err.code}",
+                                   down=err.code >= 500) from err
+            # a timeout shortened by the deadline tells nothing about the host
+            raise RequestError(f"{url} is not response! Maybe it is blocked.",
+                               down=timeout >= TIMEOUT or "timed out" not in error) from err
+        except (OSError, http.client.HTTPException) as err:
+            # connection broke while reading
+            logger.error("%s: %s", url, err)
+            raise RequestError(f"{url} is not response! Maybe it is blocked.",
+                               down=timeout >= TIMEOUT or not isinstance(err, socket.timeout)) from err
 
-        return None
+    def timeout(self) -> float:
+        """Seconds a request can wait, fewer when the search deadline is close."""
+        if self.deadline is None:
+            return TIMEOUT
+        left = self.deadline - time.monotonic()
+        if left <= 0:
+            raise RequestError(OUT_OF_TIME % config.deadline)
+        return min(TIMEOUT, left)
+
+    def _read(self, r: "http.client.HTTPResponse", on_chunk=None) -> bytes:
+        import zlib
+
+        for name, spent in r.timings.items():
+            self.metrics.add(name, spent)
+        encoding = r.headers.get("Content-Encoding", "").strip().lower()
+        # 32 + MAX_WBITS detects both gzip and zlib headers
+        unzip = (zlib.decompressobj(32 + zlib.MAX_WBITS)
+                 if encoding in ("gzip", "x-gzip", "deflate") else None)
+        received, chunks = 0, []
+        # hand data over as soon as it arrives
+        while True:
+            # stops reading when the search is out of time
+            self.timeout()
+            with self.metrics.timer("read"):
+                chunk = r.read1(CHUNK_SIZE)
+            if not chunk:
+                break
+            received += len(chunk)
+            if unzip:
+                with self.metrics.timer("decode"):
+                    chunk = unzip.decompress(chunk)
+            if chunk:
+                if on_chunk:
+                    on_chunk(chunk)
+                chunks.append(chunk)
+        # finish response to release connection
+        r.read()
+        tail = unzip.flush() if unzip else b""
+        if tail:
+            if on_chunk:
+                on_chunk(tail)
+            chunks.append(tail)
+        data = b"".join(chunks)
+        self.metrics.add("bytes", received)
+        logger.debug("%s: %s bytes received, %s bytes decoded", r.url, received, len(data))
+        return data
 
     def pretty_error(self, what: str) -> None:
-        prettyPrinter({"engine_url": self.url,
-                       "name": f"[{urllib.parse.unquote(what)}][Error]: {self.error}",
-                       "link": self.url + "error",
-                       "size": "1 TB",  # lol
-                       "seeds": 100,
-                       "leech": 100})
+        self.output({"engine_url": self.url,
+                     "name": f"[{urllib.parse.unquote(what)}][Error]: {self.error}",
+                     "link": self.url + "error",
+                     "size": "1 TB",  # lol
+                     "seeds": 100,
+                     "leech": 100})
+        self.output.flush()
+        if trace:
+            trace.dump(FILE_TRACE)
 
         self.error = None
 
 
+def summary(path: Path = FILE_M) -> None:
+    """Prints percentiles of metrics saved by searches."""
+    if not path.exists():
+        print(f"{path} not found, enable metrics in config")
+        return
+    values, engine, skipped = {}, None, 0
+    with path.open(encoding="utf-8") as fd:
+        for line in fd:
+            try:
+                record = json.loads(line)
+                row = [float(record.get(name, 0)) for name in Metrics.NAMES]
+            except (ValueError, TypeError, AttributeError):
+                # a process killed while writing leaves a broken line
+                skipped += 1
+                continue
+            engine = record.get("engine", engine)
+            for name, value in zip(Metrics.NAMES, row):
+                values.setdefault(name, []).append(value)
+    if skipped:
+        print(f"{skipped} broken lines skipped")
+    if not values:
+        return
+    print(f"{engine}: {len(values['total'])} searches")
+    print(f"{'':10}{'p50':>12}{'p95':>12}{'p99':>12}")
+    for name, data in values.items():
+        data.sort()
+        # nearest-rank percentiles
+        ranks = [data[max(math.ceil(p * len(data)) - 1, 0)] for p in (0.5, 0.95, 0.99)]
+        print(f"{name:10}" + "".join(f"{v:12.4g}" for v in ranks))
+
+
+def replay(paths: list, rounds: int = 10) -> None:
+    """Parses saved result pages the way downloaded ones are and prints speed."""
+    import tracemalloc
+
+    setup()
+    # neither requests nor login are needed to parse
+    engine = object.__new__(Megapeer)
+    engine.output = lambda row: None
+    engine._seen, engine._lock = set(), threading.Lock()
+
+    def parse(page: bytes) -> int:
+        stream = PageStream(lambda page, end: engine.draw(page, None, end), ITEM_DIVIDER,
+                            metrics)
+        for i in range(0, len(page), CHUNK_SIZE):
+            stream.feed(page[i:i + CHUNK_SIZE])
+        return len(stream.close())
+
+    for path in paths:
+        page, metrics = Path(path).read_bytes(), Metrics()
+        t0 = time.perf_counter()
+        for _ in range(rounds):
+            rows = parse(page)
+        spent = (time.perf_counter() - t0) / rounds
+        draw = metrics.values["draw"] / rounds
+        tracemalloc.start()
+        parse(page)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"{path}: {rows} rows, {rows / spent:.0f} rows/s, "
+              f"{len(page) / spent / 2**20:.1f} MB/s, peak memory {peak / 1024:.0f} KiB, "
+              f"draw {draw * 1000:.2f} ms")
+
+
 # pep8
 megapeer = Megapeer
 
 if __name__ == "__main__":
+    if sys.argv[1:2] == ["--replay"]:
+        replay(sys.argv[2:])
+        sys.exit()
+    if sys.argv[1:2] == ["--metrics"]:
+        summary(*map(Path, sys.argv[2:3]))
+        sys.exit()
     engine = megapeer()
     engine.search("доктор кто")
@@ -0,0 +1,264 @@
+# VERSION: 0.1
+# AUTHORS: DiPal
+
+# Megapeer, Rutor and rutracker at once, search engine plugin for qBittorrent
+
+import importlib
+import json
+import logging
+import re
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+from urllib.parse import unquote
+
+try:
+    from novaprinter import anySizeToBytes
+except ImportError:
+    sys.path.insert(0, str(Path(__file__).parent.parent.absolute()))
+    from novaprinter import anySizeToBytes
+
+FILE = Path(__file__)
+BASEDIR = FILE.parent.absolute()
+
+FILENAME = FILE.stem
+FILE_J = BASEDIR / (FILENAME + ".json")
+
+# plugins installed next to this one
+ENGINES = ("megapeer", "rutor", "rutracker")
+
+RE_INFOHASH = re.compile(r"urn:btih:([0-9a-zA-Z]+)")
+RE_DATE = re.compile(r"^\[\d\d\.\d\d\.\d\d] ")
+
+logger = logging.getLogger(__name__)
+
+if not __package__:
+    sys.path.insert(0, str(BASEDIR))
+
+
+@dataclass
+class Config:
+    # print only this many torrents with most seeds of all trackers, 0 prints all
+    max_results: int = 0
+
+    def __post_init__(self):
+        try:
+            if not self._validate_json(json.loads(FILE_J.read_text())):
+                raise ValueError("Incorrect json scheme.")
+        except Exception as e:
+            logger.error(e)
+            FILE_J.write_text(self.to_str())
+
+    def to_str(self) -> str:
+        return json.dumps(self.to_dict(), indent=4, sort_keys=False)
+
+    def to_dict(self) -> dict:
+        return {self._to_camel(k): v for k, v in self.__dict__.items()}
+
+    def _validate_json(self, obj: dict) -> bool:
+        is_valid = True
+        for k, v in self.__dict__.items():
+            _val = obj.get(self._to_camel(k))
+            if type(_val) is not type(v):
+                is_valid = False
+                continue
+            setattr(self, k, _val)
+        return is_valid
+
+    @staticmethod
+    def _to_camel(s: str) -> str:
+        return "".join(x.title() if i else x
+                       for i, x in enumerate(s.split("_")))
+
+
+# read on first search, so listing engines has no side effects
+config: Optional[Config] = None
+
+
+def load_engines() -> list:
+    engines = []
+    for name in ENGINES:
+        try:
+            module = importlib.import_module(("." if __package__ else "") + name, __package__)
+            engines.append(getattr(module, name))
+        except (ImportError, AttributeError) as ex:
+            logger.error("%s is not available: %s", name, ex)
+    return engines
+
+
+def log_level(engines: list) -> int:
+    """The most verbose logLevel of engines, rumeta has no config of its own."""
+    levels = []
+    for engine in engines:
+        module = sys.modules[engine.__module__]
+        module.setup()
+        level = logging.getLevelName(module.config.log_level.upper())
+        if isinstance(level, int):
+            levels.append(level)
+    return min(levels, default=logging.INFO)
+
+
+def import_time(rounds: int = 5) -> None:
+    """Prints how long engines take to import, the best of a few runs."""
+    import subprocess
+
+    for name in ENGINES:
+        best, children = None, {}
+        for _ in range(rounds):
+            # the same numbers as python -X importtime shows
+            err = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {name}"],
+                                 cwd=BASEDIR, capture_output=True, text=True).stderr
+            times = {}
+            for line in err.splitlines():
+                parts = line.split("|")
+                if len(parts) == 3 and parts[1].strip().isdigit():
+                    times[parts[2].rstrip()] = int(parts[1])
+            total = times.get(f" {name}")
+            if total is not None and (best is None or total < best):
+                # direct imports of the engine are indented by one level
+                best = total
+                children = {k.strip(): v for k, v in times.items()
+                            if k.startswith("   ") and not k.startswith("     ")}
+        if best is None:
+            print(f"{name}: failed to import")
+            continue
+        heavy = sorted(children.items(), key=lambda x: -x[1])[:5]
+        print(f"{name}: {best / 1000:.1f} ms, heaviest imports: "
+              + ", ".join(f"{k} {v / 1000:.1f} ms" for k, v in heavy))
+
+
+def torrent_key(row: dict) -> tuple:
+    infohash = RE_INFOHASH.search(row["link"])
+    if infohash:
+        return (infohash[1].lower(), )
+    # sizes are rounded differently on trackers
+    size = anySizeToBytes(str(row["size"]))
+    name = " ".join(RE_DATE.sub("", row["name"]).lower().split())
+    return name, f"{size:.2g}"
+
+
+class UniqueRows:
+    """Passes every torrent on once, whichever tracker found it first."""
+
+    def __init__(self, output):
+        self.output = output
+        self.seen = set()
+        self._lock = threading.Lock()
+
+    def __call__(self, row: dict) -> bool:
+        if not row["link"].endswith("error"):
+            key = torrent_key(row)
+            with self._lock:
+                if key in self.seen:
+                    return False
+                self.seen.add(key)
+        self.output(row)
+        return True
+
+    def flush(self) -> None:
+        self.output.flush()
+
+
+class EngineRows:
+    """Rows of one engine, counted in its metrics as its own Printer does."""
+
+    def __init__(self, output: UniqueRows, metrics):
+        self.output, self.metrics = output, metrics
+
+    def __call__(self, row: dict) -> None:
+        t0 = time.perf_counter()
+        if self.output(row):
+            self.metrics.add("rows")
+        self.metrics.add("output", time.perf_counter() - t0)
+
+    def flush(self) -> None:
+        # rows are printed or picked by maxResults once all engines are done
+        pass
+
+
+class Rumeta:
+    name = "Megapeer + Rutor + Rutracker"
+    url = "https://github.com/DiPal2/qbt_megapeer"
+    supported_categories = {"all": "all",
+                            "movies": "movies",
+                            "tv": "tv",
+                            "music": "music",
+                            "games": "games",
+                            "anime": "anime",
+                            "software": "software",
+                            "pictures": "pictures",
+                            "books": "books"}
+
+    def __init__(self):
+        self.engines = load_engines()
+
+    def search(self, what: str, cat: str = "all") -> None:
+        global config
+        if not self.engines:
+            logger.error("No engines to search with")
+            return None
+        # engines set up logging along with their config
+        logger.setLevel(log_level(self.engines))
+        if config is None:
+            config = Config()
+        t0 = time.time()
+        # found torrents of all engines are printed in batches the same way engines print them
+        module = sys.modules[self.engines[0].__module__]
+        output = module.Printer()
+        if config.max_results > 0:
+            # the best ones of all trackers are known only when all are done
+            output = module.TopRows(output, config.max_results)
+        self.output = UniqueRows(output)
+        from concurrent.futures import as_completed, ThreadPoolExecutor
+
+        # every tracker has its own thread so slow ones don't hold the rest
+        with ThreadPoolExecutor(max(len(self.engines), 1)) as executor:
+            futures = {executor.submit(self.searching, engine, what, cat): engine
+                       for engine in self.engines}
+            for future in as_completed(futures):
+                logger.info("%s: %.2f seconds", futures[future].name, future.result())
+
+        self.output.flush()
+        logger.debug("--- %s seconds ---", time.time() - t0)
+        logger.info("Found torrents: %s", len(self.output.seen))
+
+    def searching(self, engine, what: str, cat: str) -> float:
+        t0 = time.time()
+        try:
+            instance = engine()
+            instance.prepare()
+            instance.output = EngineRows(self.output, instance.metrics)
+            instance.search(what, cat)
+        except Exception as ex:
+            logger.exception(ex)
+            self.output({"engine_url": engine.url,
+                         "name": f"[{unquote(what)}][Error]: {engine.name} failed: {ex}",
+                         "link": engine.url + "error",
+                         "size": "1 TB",  # lol
+                         "seeds": 100,
+                         "leech": 100})
+        return time.time() - t0
+
+    def download_torrent(self, url: str) -> None:
+        for engine in self.engines:
+            if url.startswith((engine.url, engine.url_dl)):
+                return engine().download_torrent(url)
+        logger.error("No engine for %s", url)
+
+
+# pep8
+rumeta = Rumeta
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--import-time"]:
+        import_time()
+        sys.exit()
+    if sys.argv[1:2] == ["--metrics"]:
+        for engine in load_engines():
+            sys.modules[engine.__module__].summary()
+        sys.exit()
+    engine = rumeta()
+    engine.search("doctor")
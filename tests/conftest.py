@@ -0,0 +1,53 @@
+"""Engines loaded with their config, caches and logs in a temporary folder.
+
+The engines import novaprinter from qBittorrent, e.g.
+PYTHONPATH=~/.local/share/qBittorrent/nova3 python -m pytest tests
+"""
+import importlib
+import json
+import sys
+from dataclasses import MISSING, fields
+from pathlib import Path
+
+import pytest
+
+REPO = Path(__file__).parent.parent
+NAMES = ("megapeer", "rutor", "rutracker")
+
+
+def load(name: str, workdir: Path, monkeypatch):
+    pytest.importorskip("novaprinter")
+    if str(REPO) not in sys.path:
+        sys.path.insert(0, str(REPO))
+    module = importlib.import_module(name)
+    for key, value in list(vars(module).items()):
+        if key != "FILE" and isinstance(value, Path) and value.parent == module.BASEDIR:
+            monkeypatch.setattr(module, key, workdir / value.name)
+    monkeypatch.setattr(module, "BASEDIR", workdir)
+    # defaults, with no trace sampling to keep logs the same in every test
+    config = {module.Config._to_camel(f.name): f.default if f.default_factory is MISSING
+              else f.default_factory() for f in fields(module.Config)}
+    config["traceRate"] = 0.0
+    module.FILE_J.write_text(json.dumps(config))
+    monkeypatch.setattr(module, "config", None)
+    module.setup()
+    return module
+
+
+@pytest.fixture(params=NAMES)
+def engine(request, tmp_path, monkeypatch):
+    """Each engine module in turn, they share the same helpers."""
+    return load(request.param, tmp_path, monkeypatch)
+
+
+@pytest.fixture
+def rutracker(tmp_path, monkeypatch):
+    return load("rutracker", tmp_path, monkeypatch)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """time.time() which stands still until moved."""
+    now = [1_000_000.0]
+    monkeypatch.setattr("time.time", lambda: now[0])
+    return now
@@ -0,0 +1,46 @@
+import hashlib
+import urllib.parse
+
+import pytest
+
+INFO = b"d6:lengthi1024e4:name8:file.bin12:piece lengthi16384ee"
+TORRENT = b"d8:announce19:http://t.example/an4:info" + INFO + b"e"
+
+
+def test_end_of_values(engine):
+    assert engine.bencode_end(b"i42e", 0) == 4
+    assert engine.bencode_end(b"4:spam", 0) == 6
+    assert engine.bencode_end(b"l4:spami1ee", 0) == 11
+    assert engine.bencode_end(TORRENT, 0) == len(TORRENT)
+
+
+def test_items_of_dict(engine):
+    items = {key: TORRENT[start:end] for key, start, end in engine.bencode_items(TORRENT)}
+    assert items == {b"announce": b"19:http://t.example/an", b"info": INFO}
+
+
+@pytest.mark.parametrize("data", [
+    b"",
+    b"x",
+    b"d4:info",
+    b"d4:infoi1",
+    b"d4:info9:abc",
+    b"d4:info-9:abce",
+    b"d4:infod4:name99999:xee",
+    b"l" * 5000,
+])
+def test_broken_data_has_no_hash(engine, data):
+    assert engine.info_hash(data) is None
+    assert engine.magnet_uri(data) is None
+
+
+def test_info_hash(engine):
+    assert engine.info_hash(TORRENT) == hashlib.sha1(INFO).hexdigest()
+
+
+def test_magnet_uri(engine):
+    magnet = engine.magnet_uri(TORRENT)
+    assert magnet.startswith("magnet:?")
+    assert urllib.parse.parse_qs(magnet[8:]) == {
+        "xt": [f"urn:btih:{hashlib.sha1(INFO).hexdigest()}"],
+        "dn": ["file.bin"], "tr": ["http://t.example/an"]}
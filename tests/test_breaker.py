@@ -0,0 +1,64 @@
+import pytest
+
+URL = "https://tracker.example/search?q=doctor"
+
+
+@pytest.fixture
+def breakers(engine, tmp_path):
+    # two processes share the state through the same files
+    return [engine.Breaker(tmp_path / "hosts.json", tmp_path / "hosts.lock") for _ in range(2)]
+
+
+def fail(engine, breaker, times):
+    for _ in range(times):
+        breaker.record(URL, False)
+
+
+def test_opens_after_failures_in_a_row(engine, breakers, clock):
+    first, second = breakers
+    fail(engine, first, engine.FAILURES - 1)
+    second.check(URL)
+    first.record(URL, True)
+    fail(engine, first, engine.FAILURES - 1)
+    second.check(URL)
+    first.record(URL, False)
+    for breaker in breakers:
+        with pytest.raises(engine.RequestError, match="tracker.example is not responding"):
+            breaker.check(URL)
+    # other hosts are fine
+    second.check("https://other.example/")
+
+
+def test_one_probe_after_cool_down(engine, breakers, clock):
+    first, second = breakers
+    fail(engine, first, engine.FAILURES)
+    clock[0] += engine.COOLDOWN
+    first.check(URL)
+    # the others wait for the probe
+    with pytest.raises(engine.RequestError):
+        second.check(URL)
+    first.record(URL, True)
+    second.check(URL)
+    assert not first.path.exists()
+
+
+def test_failed_probe_cools_down_again(engine, breakers, clock):
+    first, second = breakers
+    fail(engine, first, engine.FAILURES)
+    clock[0] += engine.COOLDOWN
+    first.check(URL)
+    first.record(URL, False)
+    for breaker in breakers:
+        with pytest.raises(engine.RequestError):
+            breaker.check(URL)
+    clock[0] += engine.COOLDOWN
+    second.check(URL)
+
+
+def test_probe_which_never_returns_is_taken_over(engine, breakers, clock):
+    first, second = breakers
+    fail(engine, first, engine.FAILURES)
+    clock[0] += engine.COOLDOWN
+    first.check(URL)
+    clock[0] += engine.TIMEOUT
+    second.check(URL)
@@ -0,0 +1,53 @@
+from test_bencode import INFO, TORRENT
+
+
+def test_pages_expire(engine, tmp_path, clock):
+    cache = engine.Cache(tmp_path / "pages.db", ttl=60, size=10_000)
+    cache.put("doctor", 2, [["a", 1], ["b", 2]], 100)
+    clock[0] += 59
+    assert cache.get("doctor") == (2, [["a", 1], ["b", 2]])
+    clock[0] += 1
+    assert cache.get("doctor") is None
+    assert cache.stats() == {"hits": 1, "misses": 1, "saved": 100, "pages": 1, "bytes": 20}
+
+
+def test_least_recently_used_page_goes(engine, tmp_path, clock):
+    # room for two pages of 10 bytes
+    cache = engine.Cache(tmp_path / "pages.db", ttl=60, size=25)
+    for key in ("a", "b"):
+        cache.put(key, 1, ["12345"], 10)
+        clock[0] += 1
+    assert cache.get("a") is not None
+    clock[0] += 1
+    cache.put("c", 1, ["12345"], 10)
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+
+
+def test_torrent_topics_expire(engine, tmp_path, clock):
+    cache = engine.TorrentCache(tmp_path / "t.db", tmp_path / "torrents", size=10_000, ttl=60)
+    path = cache.put("123", TORRENT)
+    assert path.read_bytes() == TORRENT
+    assert cache.get("123") == path
+    clock[0] += 60
+    assert cache.get("123") is None
+    # the file itself is still there under its infohash
+    assert cache.get(engine.info_hash(TORRENT)) == path
+
+
+def test_torrents_over_size_are_evicted(engine, tmp_path, clock):
+    other = TORRENT.replace(b"file.bin", b"file.iso")
+    cache = engine.TorrentCache(tmp_path / "t.db", tmp_path / "torrents", size=len(TORRENT) + 1, ttl=60)
+    first = cache.put("1", TORRENT)
+    clock[0] += 1
+    second = cache.put("2", other)
+    assert not first.exists() and cache.get("1") is None
+    assert cache.get("2") == second
+
+
+def test_torrent_bigger_than_cache_is_not_kept(engine, tmp_path):
+    cache = engine.TorrentCache(tmp_path / "t.db", tmp_path / "torrents", size=len(INFO), ttl=60)
+    assert cache.put("1", TORRENT) is None
+    assert cache.put("2", b"not a torrent") is None
+    assert list((tmp_path / "torrents").iterdir()) == []
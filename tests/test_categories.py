@@ -0,0 +1,24 @@
+def test_resolve_categories(rutracker):
+    tree = [
+        [1, 0, "Зарубежное кино", "Кино"],
+        # excluded with everything below it
+        [2, 1, "Документальные фильмы", "Кино"],
+        [3, 2, "Природа", "Кино"],
+        [4, 0, "Сериалы США", "Сериалы"],
+        [5, 0, "Apple Фильмы", "Apple"],
+        # already taken with its parent
+        [6, 5, "4K Фильмы", "Apple"],
+        [7, 0, "Apple Музыка", "Apple"],
+    ]
+    expected = dict.fromkeys(rutracker.CAT_DETECTOR, [])
+    expected.update(movies=[1, 5], tv=[4])
+    assert rutracker.resolve_categories(tree) == expected
+
+
+def test_empty_tree(rutracker):
+    assert rutracker.resolve_categories([]) == dict.fromkeys(rutracker.CAT_DETECTOR, [])
+
+
+def test_split(rutracker):
+    assert rutracker.split(list(range(5)), 2) == [[0, 1, 2], [3, 4]]
+    assert rutracker.split([1], 3) == [[1]]
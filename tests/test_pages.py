@@ -0,0 +1,110 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+
+@pytest.fixture
+def executor(engine, monkeypatch):
+    monkeypatch.setattr(engine, "backoff", lambda attempt: 0)
+    with ThreadPoolExecutor(4) as executor:
+        yield executor
+
+
+class Breaker:
+    def __init__(self):
+        self.records = []
+
+    def record(self, url, ok):
+        self.records.append((url, ok))
+
+
+def fetcher(engine, *results):
+    """fetch() giving results in turn, an exception is raised."""
+    calls = []
+
+    def fetch(url, first):
+        result = results[min(len(calls), len(results) - 1)]
+        calls.append(url)
+        if isinstance(result, Exception):
+            raise result
+        return engine.PageResult(url, **result)
+    return fetch, calls
+
+
+def test_failed_page_is_retried(engine, executor):
+    fetch, calls = fetcher(engine, {"error": "503", "down": True}, {"rows": [1], "total": 1})
+    breaker, metrics = Breaker(), engine.Metrics()
+    pages = engine.Pages(executor, fetch, breaker=breaker, retries=1, metrics=metrics)
+    pages.submit("p1", first=True, tag=0)
+    results = list(pages)
+    assert [(tag, page.rows, page.total) for tag, page in results] == [(0, [1], 1)]
+    assert calls == ["p1", "p1"]
+    assert metrics.values["retries"] == 1
+    assert breaker.records == []
+    assert pages.report() is None
+
+
+def test_host_failure_is_counted_once_after_retries(engine, executor):
+    fetch, calls = fetcher(engine, {"error": "503", "down": True})
+    breaker = Breaker()
+    pages = engine.Pages(executor, fetch, breaker=breaker, retries=2)
+    pages.submit("p1")
+    assert [page.error for _, page in pages] == ["503"]
+    assert len(calls) == 3
+    assert breaker.records == [("p1", False)]
+    assert pages.report() == "503"
+
+
+def test_unexpected_error_fails_only_its_page(engine, executor):
+    fetch, _ = fetcher(engine, KeyError("x"), {"rows": [1]})
+    pages = engine.Pages(executor, fetch, retries=0)
+    pages.submit("p1")
+    list(pages)
+    pages.fetch = fetcher(engine, {"rows": [2]})[0]
+    pages.submit("p2")
+    list(pages)
+    assert [page.status for page in pages.done] == ["failed", "ok"]
+    assert pages.report() == "1 of 2 pages failed: p1 failed: 'x'"
+
+
+def test_pages_after_deadline_are_skipped(engine, executor):
+    fetch, calls = fetcher(engine, {"rows": [1]})
+    pages = engine.Pages(executor, fetch, deadline=time.monotonic() - 1)
+    pages.submit("p1")
+    assert list(pages) == [] and calls == []
+    assert pages.report() == engine.OUT_OF_TIME % engine.config.deadline
+
+
+def test_slow_pages_are_given_up_at_deadline(engine, executor):
+    release = threading.Event()
+
+    def fetch(url, first):
+        if url == "slow":
+            release.wait(5)
+        return engine.PageResult(url, rows=[url])
+
+    pages = engine.Pages(executor, fetch, deadline=time.monotonic() + 0.2)
+    try:
+        pages.submit("fast")
+        pages.submit("slow")
+        t0 = time.monotonic()
+        assert [page.rows for _, page in pages] == [["fast"]]
+        assert time.monotonic() - t0 < 1
+    finally:
+        release.set()
+    assert pages.report() == "1 of 2 pages failed: " + engine.OUT_OF_TIME % engine.config.deadline
+
+
+def test_no_retry_after_deadline(engine, executor):
+    def fetch(url, first):
+        time.sleep(0.3)
+        return engine.PageResult(url, error="503")
+
+    fetch_calls = []
+    pages = engine.Pages(executor, lambda url, first: fetch_calls.append(url) or fetch(url, first),
+                         deadline=time.monotonic() + 0.2, retries=3)
+    pages.submit("p1")
+    list(pages)
+    assert fetch_calls == ["p1"]